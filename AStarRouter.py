@@ -3,8 +3,12 @@
 
 from RouterBase import RouterBase
 from SolverSetup import SolverSetup
+from CompiledNetwork import RoutingState
+from OverlayGraph import OverlayGraph
 
 import networkx as nx
+import numpy as np
+from scipy.optimize import linear_sum_assignment
 import pulp
 import itertools
 import random
@@ -14,6 +18,33 @@ USED_LINK_WEIGHT = 10000
 ALU_OUT_WEIGTH = 1000
 PENALTY_CONST = 1000
 
+# graph attribute to keep the routing state
+STATE_KEY = "routing_state"
+# graph attribute to keep the statistics of the routing state
+# (it remains after cleaning the graph)
+STATS_KEY = "routing_stats"
+
+# fanout routing modes
+#   path: each destination is routed from the source
+#         reusing the links already routed for the source with zero cost
+#   tree: each destination is routed from the whole routing tree
+#         made for the source so far
+FANOUT_MODES = ["path", "tree"]
+
+# cost modes of the resource (const reg and port) assignment
+#   refine: distances estimated by the distance tables of the PE array model
+#           are replaced with the exact ones for the chosen assignment
+#           until the assignment does not change
+#   exact: exact distances on the routed graph are calculated for all the pairs
+#   table: only the estimated distances are used
+RESOURCE_COST_MODES = ["refine", "exact", "table"]
+
+# margin of the search windows
+#   each path is searched in the bounding box of the source and the destination
+#   extended by the margin, and the margin is doubled if there is no path in it
+#   None means the whole PE array is searched
+DEFAULT_BB_MARGIN = None
+
 # setting up for pulp solver
 try:
     solver = SolverSetup("ILP").getSolver()
@@ -31,6 +62,54 @@ class AStarRouter(RouterBase):
     def get_penalty_cost():
         return PENALTY_CONST
 
+    @staticmethod
+    def parse_options(options):
+        """Parses router options.
+
+            Available options:
+                fanout: fanout routing mode ("path" or "tree")
+                resource_cost: cost mode of the resource assignment
+                               ("refine", "exact" or "table")
+                bb_margin: margin of the bounding box search windows
+                           (non-negative integer, or "none" to search the whole PE array)
+        """
+        parsed = {"fanout": FANOUT_MODES[0], "resource_cost": RESOURCE_COST_MODES[0], \
+                  "bb_margin": DEFAULT_BB_MARGIN}
+        for name, value in options.items():
+            if name == "fanout":
+                if not value in FANOUT_MODES:
+                    raise ValueError("Unknown fanout mode for AStarRouter: " + value)
+                parsed["fanout"] = value
+            elif name == "resource_cost":
+                if not value in RESOURCE_COST_MODES:
+                    raise ValueError("Unknown resource cost mode for AStarRouter: " + value)
+                parsed["resource_cost"] = value
+            elif name == "bb_margin":
+                if value == "none":
+                    parsed["bb_margin"] = None
+                    continue
+                try:
+                    parsed["bb_margin"] = int(value)
+                except ValueError:
+                    raise ValueError("Invalid bb_margin for AStarRouter: " + value)
+                if parsed["bb_margin"] < 0:
+                    raise ValueError("bb_margin for AStarRouter must be non-negative")
+            else:
+                raise ValueError("Unknown option for AStarRouter: " + name)
+        return parsed
+
+    @staticmethod
+    def get_routing_stats(routed_graph):
+        """Returns statistics of the routing.
+
+            Available statistics:
+                template_hit: the number of path searches answered by the route templates
+                template_miss: the number of the other path searches
+                reuse_hit: the number of inherited routes reused as they are
+                reuse_miss: the number of inherited routes rerouted due to conflicts
+        """
+        return dict(routed_graph.graph.get(STATS_KEY, {}))
+
     @staticmethod
     def set_default_weights(CGRA):
         # CGRA.setInitEdgeAttr("weight", 1, "SE")
@@ -39,6 +118,59 @@ class AStarRouter(RouterBase):
         # CGRA.setInitEdgeAttr("weight", 0, "OUT_PORT")
         CGRA.setInitEdgeAttr("weight", ALU_OUT_WEIGTH, "ALU")
 
+    @staticmethod
+    def __get_state(CGRA, routed_graph, info = None):
+        """Returns the routing state attached to the routed graph.
+            It is made from the compiled network of the CGRA at the first call.
+
+            Args:
+                CGRA (PEArrayModel): A model of the CGRA
+                routed_graph (networkx DiGraph): A graph where the paths are routed
+                Option:
+                    info (dict): router options to be applied to the searches
+
+            Returns:
+                RoutingState: the routing state
+        """
+        if not STATE_KEY in routed_graph.graph:
+            routed_graph.graph[STATE_KEY] = \
+                RoutingState(CGRA.getCompiledNetwork(), routed_graph)
+            routed_graph.graph[STATS_KEY] = routed_graph.graph[STATE_KEY].stats
+        if not info is None:
+            routed_graph.graph[STATE_KEY].margin = info.get("bb_margin", DEFAULT_BB_MARGIN)
+        return routed_graph.graph[STATE_KEY]
+
+    @staticmethod
+    def __find_path(graph, src, dst, limit = None):
+        """Finds the shortest path on the compiled network.
+
+            Args:
+                graph (networkx DiGraph): A graph where the paths are routed
+                src (str): source node
+                dst (str): destination node
+                Option:
+                    limit (int): paths whose costs exceed the limit are not searched
+
+            Returns:
+                (list, int): path, cost
+
+            Raise:
+                networkx.NetworkXNoPath: if there is no path
+        """
+        return graph.graph[STATE_KEY].findPath(src, dst, limit)
+
+    @staticmethod
+    def __set_weight(graph, e, weight):
+        """set weight of the edge
+
+            Args:
+                graph (networkx DiGraph): A graph where the paths are routed
+                e (tuple of str): the edge
+                weight (int): the weight
+        """
+        graph.succ[e[0]][e[1]]["weight"] = weight
+        graph.graph[STATE_KEY].setWeight(e, weight)
+
     @staticmethod
     def __init_ALU(CGRA, mapping, routed_graph):
         """Initialize ALU nodes in the PE array graph.
@@ -74,8 +206,8 @@ class AStarRouter(RouterBase):
                     if CGRA.isRoutingALU((x, y)):
                         # remove high cost of ALU out
                         for suc_element in routed_graph.successors(alu):
-                            routed_graph.edges[alu, suc_element]["weight"] = \
-                                CGRA.getLinkWeight((alu, suc_element))
+                            AStarRouter.__set_weight(routed_graph, (alu, suc_element), \
+                                CGRA.getLinkWeight((alu, suc_element)))
                         # Routing ALU candidates
                         routed_graph.nodes[alu]["routable"] = True
                         routed_graph.nodes[alu]["in_capacity"] = 1
@@ -97,6 +229,9 @@ class AStarRouter(RouterBase):
                             graph.predecessors(target) \
                             if p not in srcs]
         graph.remove_edges_from(remove_edges)
+        state = graph.graph[STATE_KEY]
+        for e in remove_edges:
+            state.removeEdge(e)
 
     @staticmethod
     def __rm_ALU_out_cost(CGRA, graph, alu):
@@ -114,8 +249,7 @@ class AStarRouter(RouterBase):
                 continue
             e = (alu, suc_element)
             if graph.edges[e]["free"]:
-                graph.edges[e]["weight"] = \
-                    CGRA.getLinkWeight(e)
+                AStarRouter.__set_weight(graph, e, CGRA.getLinkWeight(e))
 
     @staticmethod
     def __disable_free_inedge(graph, target):
@@ -127,7 +261,7 @@ class AStarRouter(RouterBase):
         """
         for e in graph.in_edges(target):
             if graph.edges[e]["free"]:
-                graph.edges[e]["weight"] = USED_LINK_WEIGHT
+                AStarRouter.__set_weight(graph, e, USED_LINK_WEIGHT)
 
     @staticmethod
     def __mark_used_node(graph, v):
@@ -139,7 +273,7 @@ class AStarRouter(RouterBase):
 
         """
         for e in graph.out_edges(v):
-            graph.edges[e]["weight"] = USED_LINK_WEIGHT
+            AStarRouter.__set_weight(graph, e, USED_LINK_WEIGHT)
 
     @staticmethod
     def __mark_used_edge(graph, e):
@@ -152,10 +286,19 @@ class AStarRouter(RouterBase):
         """
         graph.edges[e]["weight"] = USED_LINK_WEIGHT
         graph.edges[e]["free"] = False
+        graph.graph[STATE_KEY].setUsed(e, USED_LINK_WEIGHT)
 
     @staticmethod
-    def comp_routing(CGRA, comp_DFG, mapping, routed_graph, **info):
-        AStarRouter.__init_ALU(CGRA, mapping, routed_graph)
+    def comp_routing(CGRA, comp_DFG, mapping, routed_graph, budget = None, **info):
+        AStarRouter.init_comp_routing(CGRA, mapping, routed_graph, **info)
+
+        # routes inherited from the parents
+        #       key  : (src alu, dst alu)
+        #       value: path
+        inherited = info.get("inherited_routes")
+        if inherited is None:
+            inherited = {}
+        mapped_alus = set(CGRA.getMappedALUs(mapping).values())
 
         # get out degree for each node
         out_deg = {v: comp_DFG.out_degree(v) for v in comp_DFG.nodes() if comp_DFG.out_degree(v) > 0 }
@@ -179,19 +322,34 @@ class AStarRouter(RouterBase):
                             for dst_node in \
                             sorted(list(comp_DFG.successors(src_node)), \
                                 key=lambda x: AStarRouter.__manhattan_dist(mapping[x], mapping[src_node])) }
+            # inherited paths not passing through the other mapped ALUs
+            fixed = {dst: inherited[(src_alu, dst)] for dst in dest_alus.keys() \
+                        if (src_alu, dst) in inherited and \
+                            mapped_alus.isdisjoint(inherited[(src_alu, dst)][1:-1])}
             # route each path
-            route_cost += AStarRouter.__single_src_multi_dest_route(CGRA, routed_graph, src_alu, dest_alus)
+            route_cost += AStarRouter.__single_src_multi_dest_route(CGRA, routed_graph, src_alu, dest_alus, \
+                                                                    info.get("fanout", FANOUT_MODES[0]), \
+                                                                    AStarRouter.__rest_budget(budget, route_cost), \
+                                                                    "comp", fixed)
+            if not budget is None and route_cost > budget:
+                # the remaining edges are not routed
+                return route_cost
 
         return route_cost
 
     @staticmethod
-    def const_routing(CGRA, const_DFG, mapping, routed_graph, **info):
+    def const_routing(CGRA, const_DFG, mapping, routed_graph, budget = None, **info):
         if len(const_DFG.nodes()) == 0:
             return 0
+        AStarRouter.__get_state(CGRA, routed_graph, info)
 
-        const_map = AStarRouter.__resource_mapping(CGRA, CGRA.getConstRegs(), const_DFG, mapping, routed_graph)
+        const_map = AStarRouter.__resource_mapping(CGRA, CGRA.getConstRegs(), const_DFG, mapping, routed_graph, \
+                                                   CGRA.getDistanceTable("Const"), \
+                                                   info.get("resource_cost", RESOURCE_COST_MODES[0]))
         if const_map is None:
-            return PENALTY_CONST * len(list(const_DFG.edges()))
+            route_cost = PENALTY_CONST * len(list(const_DFG.edges()))
+            AStarRouter.__exceeds(routed_graph, route_cost, budget, "const", None, None)
+            return route_cost
         else:
             # save const mapping
             nx.set_node_attributes(routed_graph, {c_reg: edges[0][0] \
@@ -203,16 +361,27 @@ class AStarRouter(RouterBase):
             dst_alus = {CGRA.getNodeName("ALU", pos=mapping[dst_node]):\
                         const_DFG.edges[(c, dst_node)]["operand"] \
                         for c, dst_node in edges}
-            route_cost += AStarRouter.__single_src_multi_dest_route(CGRA, routed_graph, c_reg, dst_alus)
+            route_cost += AStarRouter.__single_src_multi_dest_route(CGRA, routed_graph, c_reg, dst_alus, \
+                                                                    info.get("fanout", FANOUT_MODES[0]), \
+                                                                    AStarRouter.__rest_budget(budget, route_cost), \
+                                                                    "const")
+            if not budget is None and route_cost > budget:
+                # the remaining edges are not routed
+                return route_cost
 
         return route_cost
 
 
     @staticmethod
-    def input_routing(CGRA, in_DFG, mapping, routed_graph, **info):
-        input_map = AStarRouter.__resource_mapping(CGRA, CGRA.getInputPorts(), in_DFG, mapping, routed_graph)
+    def input_routing(CGRA, in_DFG, mapping, routed_graph, budget = None, **info):
+        AStarRouter.__get_state(CGRA, routed_graph, info)
+        input_map = AStarRouter.__resource_mapping(CGRA, CGRA.getInputPorts(), in_DFG, mapping, routed_graph, \
+                                                   CGRA.getDistanceTable("IN_PORT"), \
+                                                   info.get("resource_cost", RESOURCE_COST_MODES[0]))
         if input_map is None:
-            return PENALTY_CONST * len(list(in_DFG.edges()))
+            route_cost = PENALTY_CONST * len(list(in_DFG.edges()))
+            AStarRouter.__exceeds(routed_graph, route_cost, budget, "input", None, None)
+            return route_cost
         else:
             # save input mapping
             nx.set_node_attributes(routed_graph, {i_port: edges[0][0] \
@@ -224,12 +393,20 @@ class AStarRouter(RouterBase):
             dst_alus = {CGRA.getNodeName("ALU", pos=mapping[dst_node]):\
                         in_DFG.edges[(i, dst_node)]["operand"] \
                         for i, dst_node in edges}
-            route_cost += AStarRouter.__single_src_multi_dest_route(CGRA, routed_graph, i_port, dst_alus)
+            route_cost += AStarRouter.__single_src_multi_dest_route(CGRA, routed_graph, i_port, dst_alus, \
+                                                                    info.get("fanout", FANOUT_MODES[0]), \
+                                                                    AStarRouter.__rest_budget(budget, route_cost), \
+                                                                    "input")
+            if not budget is None and route_cost > budget:
+                # the remaining edges are not routed
+                return route_cost
 
         return route_cost
 
     @staticmethod
-    def output_routing(CGRA, out_DFG, mapping, routed_graph, preg_conf = None,  dontuse = [], **info):
+    def output_routing(CGRA, out_DFG, mapping, routed_graph, preg_conf = None,  dontuse = [], \
+                       budget = None, **info):
+        AStarRouter.__get_state(CGRA, routed_graph, info)
 
         route_cost = 0
 
@@ -269,6 +446,8 @@ class AStarRouter(RouterBase):
                 # extend data path
                 path, cost = AStarRouter.__find_nearest_node(routed_graph, src, free_last_stage_SEs)
                 if path is None:
+                    AStarRouter.__exceeds(routed_graph, PENALTY_CONST * remain_edges, budget, \
+                                          "output", src, None)
                     return PENALTY_CONST * remain_edges
                 route_cost += cost
 
@@ -295,6 +474,8 @@ class AStarRouter(RouterBase):
             # output routing
             path, cost = AStarRouter.__find_nearest_node(routed_graph, src, out_port_nodes)
             if path is None:
+                AStarRouter.__exceeds(routed_graph, PENALTY_CONST * remain_edges, budget, \
+                                      "output", src, None)
                 return PENALTY_CONST * remain_edges
             route_cost += cost
 
@@ -320,15 +501,22 @@ class AStarRouter(RouterBase):
             routed_graph.nodes[path[-1]]["map"] = o
 
             remain_edges -= 1
+            if AStarRouter.__exceeds(routed_graph, route_cost, budget, "output", src, path[-1]):
+                # the remaining edges are not routed
+                return route_cost
 
         return route_cost
 
     @staticmethod
-    def inout_routing(CGRA, in_DFG, out_DFG, mapping, routed_graph, **info):
+    def inout_routing(CGRA, in_DFG, out_DFG, mapping, routed_graph, budget = None, **info):
+        AStarRouter.__get_state(CGRA, routed_graph, info)
         io_port = CGRA.getInoutPorts()
-        io_map = AStarRouter.__io_mapping(CGRA, io_port, in_DFG, out_DFG, mapping, routed_graph)
+        io_map = AStarRouter.__io_mapping(CGRA, io_port, in_DFG, out_DFG, mapping, routed_graph, \
+                                          info.get("resource_cost", RESOURCE_COST_MODES[0]))
         if io_map is None:
-            return PENALTY_CONST * (len(list(in_DFG.edges())) + len(list(out_DFG.edges())))
+            route_cost = PENALTY_CONST * (len(list(in_DFG.edges())) + len(list(out_DFG.edges())))
+            AStarRouter.__exceeds(routed_graph, route_cost, budget, "inout", None, None)
+            return route_cost
         else:
             input_map, output_map = io_map
             # save io mapping
@@ -345,7 +533,13 @@ class AStarRouter(RouterBase):
             dst_alus = {CGRA.getNodeName("ALU", pos=mapping[dst_node]):\
                         in_DFG.edges[(i, dst_node)]["operand"] \
                         for i, dst_node in edges[inode]}
-            route_cost += AStarRouter.__single_src_multi_dest_route(CGRA, routed_graph, i_port, dst_alus)
+            route_cost += AStarRouter.__single_src_multi_dest_route(CGRA, routed_graph, i_port, dst_alus, \
+                                                                    info.get("fanout", FANOUT_MODES[0]), \
+                                                                    AStarRouter.__rest_budget(budget, route_cost), \
+                                                                    "inout")
+            if not budget is None and route_cost > budget:
+                # the remaining edges are not routed
+                return route_cost
 
         # output routing
         for o_port, onode in output_map.items():
@@ -356,9 +550,7 @@ class AStarRouter(RouterBase):
             AStarRouter.__rm_ALU_out_cost(CGRA, routed_graph, alu)
             # get shortest path
             try:
-                path = nx.astar_path(routed_graph, alu, o_port)
-                cost = sum([routed_graph.edges[(path[i], path[i+1])]["weight"]\
-                             for i in range(len(path) - 1)])
+                path, cost = AStarRouter.__find_path(routed_graph, alu, o_port)
 
                 if cost > ALU_OUT_WEIGTH:
                     route_cost += PENALTY_CONST
@@ -383,10 +575,14 @@ class AStarRouter(RouterBase):
             except nx.exception.NetworkXNoPath:
                 route_cost += PENALTY_CONST
 
+            if AStarRouter.__exceeds(routed_graph, route_cost, budget, "inout", alu, o_port):
+                # the remaining edges are not routed
+                return route_cost
+
         return route_cost
 
     @staticmethod
-    def __resource_mapping(CGRA, resources, DFG, mapping, routed_graph):
+    def __resource_mapping(CGRA, resources, DFG, mapping, routed_graph, table, cost_mode):
         """Decides resource mapping for const regs or input ports.
 
             Args:
@@ -397,6 +593,8 @@ class AStarRouter(RouterBase):
                     keys (str): operation node names of DFG
                     values (tuple): PE coordinates
                 routed_graph (networkx DiGraph): PE array graph
+                table (dict): distance table of the resources (see PEArrayModel.getDistanceTable)
+                cost_mode (str): cost mode of the assignment (see RESOURCE_COST_MODES)
 
             Returns:
                 dict: const mapping
@@ -414,17 +612,117 @@ class AStarRouter(RouterBase):
             return None
 
         # calculate distance
-        dist_from_res = {}
-        for r, v in routed_edges:
-            dist_from_res[(r, v)] = {}
-            for res_node in resources:
-                alu = CGRA.getNodeName("ALU", pos=mapping[v])
-                try:
-                    dist = nx.astar_path_length(routed_graph, res_node, alu)
-                except nx.exception.NetworkXNoPath:
-                    dist = PENALTY_CONST
-                dist_from_res[(r, v)][res_node] = dist + 1
+        def exact_dist(e, res_node):
+            alu = CGRA.getNodeName("ALU", pos=mapping[e[1]])
+            try:
+                _, dist = AStarRouter.__find_path(routed_graph, res_node, alu)
+            except nx.exception.NetworkXNoPath:
+                dist = PENALTY_CONST
+            return dist + 1
+
+        def estimated_dist(e, res_node):
+            alu = CGRA.getNodeName("ALU", pos=mapping[e[1]])
+            return table[res_node].get(alu, PENALTY_CONST) + 1
+
+        return AStarRouter.__solve_assignment(
+                    lambda dist: AStarRouter.__assign_resources(resources, routed_edges, dist),
+                    {e: resources for e in routed_edges}, exact_dist, estimated_dist, cost_mode)
+
+    @staticmethod
+    def __solve_assignment(solve, candidates, exact_dist, estimated_dist, cost_mode):
+        """Solves an assignment problem with the estimated distances.
+            In refine mode, the estimated distances of the chosen pairs are replaced
+            with the exact ones until all of them are exact.
+            Since the estimated distances are lower bounds of the exact ones,
+            the result is also optimal for the exact distances.
+
+            Args:
+                solve (function): solver of the assignment
+                    It receives the distance and returns the result and the chosen pairs.
+                candidates (dict): candidate resources for each edge
+                exact_dist (function): exact distance for a pair of an edge and a resource
+                estimated_dist (function): lower bound of exact_dist
+                cost_mode (str): cost mode of the assignment (see RESOURCE_COST_MODES)
+
+            Returns:
+                the result of solve
+        """
+        if cost_mode == "exact":
+            dist_func = exact_dist
+        else:
+            dist_func = estimated_dist
+        dist_from_res = {e: {res: dist_func(e, res) for res in res_list} \
+                         for e, res_list in candidates.items()}
+        if cost_mode != "refine":
+            return solve(dist_from_res)[0]
+
+        exact_pairs = set()
+        while True:
+            result, chosen = solve(dist_from_res)
+            if result is None:
+                return None
+            estimated = [(e, res) for e, res in chosen if not (e, res) in exact_pairs]
+            if len(estimated) == 0:
+                return result
+            for e, res in estimated:
+                dist_from_res[e][res] = exact_dist(e, res)
+                exact_pairs.add((e, res))
+
+    @staticmethod
+    def __assign_resources(resources, routed_edges, dist_from_res):
+        """Decides resource mapping from the distances.
+
+            Args:
+                resources (list-like): mapped node names in the PE array graph
+                routed_edges (list-like): edges to be routed
+                dist_from_res (dict): distance between each edge and resource
+                    keys (tuple): edge
+                    values (dict): distance for each resource
 
+            Returns:
+                (dict, list): resource mapping (see __resource_mapping),
+                              chosen pairs of edge and resource
+        """
+        # at first, each value is assigned to a single resource by Hungarian method
+        # values in the order of appearance
+        values = list(dict.fromkeys([r for r, v in routed_edges]))
+        cost = np.array([[sum([dist_from_res[e][res_node] for e in routed_edges if e[0] == r]) \
+                          for res_node in resources] for r in values]).reshape(-1, len(resources))
+        rows, cols = linear_sum_assignment(cost)
+        # the assignment is also optimal for the ILP below if:
+        #   1. no resource is left for a value to use multiple resources
+        #   2. each value has only one edge so that it needs only one resource
+        #   3. each edge gets its nearest resource
+        if len(values) == len(resources) or \
+                len(values) == len(routed_edges) or \
+                cost[rows, cols].sum() == \
+                    sum([min(dist_from_res[e].values()) for e in routed_edges]):
+            res_value = {resources[c]: values[r] for r, c in zip(rows, cols)}
+            res_mapping = {res_node: [e for e in routed_edges if res_value.get(res_node) == e[0]] \
+                           for res_node in resources}
+        else:
+            # otherwise, a value may be better to use multiple resources
+            res_mapping = AStarRouter.__resource_mapping_ILP(resources, routed_edges, dist_from_res)
+
+        if res_mapping is None:
+            return None, []
+        return res_mapping, [(e, res_node) for res_node, edges in res_mapping.items() for e in edges]
+
+    @staticmethod
+    def __resource_mapping_ILP(resources, routed_edges, dist_from_res):
+        """Decides resource mapping by ILP allowing a value to use multiple resources.
+
+            Args:
+                resources (list-like): mapped node names in the PE array graph
+                routed_edges (list-like): edges to be routed
+                dist_from_res (dict): distance between each edge and resource
+                    keys (tuple): edge
+                    values (dict): distance for each resource
+
+            Returns:
+                dict: resource mapping (see __resource_mapping)
+                      In case of failure, return None
+        """
         # make pulp problem
         prob = pulp.LpProblem("Make_Resouece_Mapping", pulp.LpMinimize)
 
@@ -460,7 +758,7 @@ class AStarRouter(RouterBase):
 
 
     @staticmethod
-    def __io_mapping(CGRA, ioports, in_DFG, out_DFG, mapping, routed_graph):
+    def __io_mapping(CGRA, ioports, in_DFG, out_DFG, mapping, routed_graph, cost_mode):
         """Decides io-mapping under the constraint about sharing input port and output port
 
             Args:
@@ -472,6 +770,7 @@ class AStarRouter(RouterBase):
                     keys (str): operation node names of DFG
                     values (tuple): PE coordinates
                 routed_graph (networkx DiGraph): PE array graph
+                cost_mode (str): cost mode of the assignment (see RESOURCE_COST_MODES)
 
             Returns:
                 tuple of dict: (input_mapping, output_mapping)
@@ -498,75 +797,116 @@ class AStarRouter(RouterBase):
             return None
 
         # calculate distance
-        dist_from_res = {}
-        for i, v in routed_in_edges:
-            dist_from_res[(i, v)] = {}
-            for ip in iport_list:
-                alu = CGRA.getNodeName("ALU", pos=mapping[v])
+        in_table = CGRA.getDistanceTable("IN_PORT")
+        out_table = CGRA.getDistanceTable("OUT_PORT")
+
+        def exact_dist(e, port):
+            if port in iport_list:
+                alu = CGRA.getNodeName("ALU", pos=mapping[e[1]])
                 try:
-                    dist = nx.astar_path_length(routed_graph, ip, alu)
+                    _, dist = AStarRouter.__find_path(routed_graph, port, alu)
                 except nx.exception.NetworkXNoPath:
                     dist = PENALTY_CONST
-                dist_from_res[(i, v)][ip] = dist + 1
-        for v, o in routed_out_edges:
-            dist_from_res[(v, o)] = {}
-            for op in oport_list:
-                alu = CGRA.getNodeName("ALU", pos=mapping[v])
+                return dist + 1
+            else:
+                alu = CGRA.getNodeName("ALU", pos=mapping[e[0]])
                 try:
-                    path = nx.astar_path(routed_graph, alu, op)
-                    dist = sum([routed_graph.edges[(path[i], path[i+1])]["weight"]\
-                             for i in range(len(path) - 1)])
+                    path, dist = AStarRouter.__find_path(routed_graph, alu, port)
                     if routed_graph.edges[(path[0], path[1])]["weight"] == ALU_OUT_WEIGTH:
                         if routed_graph.edges[(path[0], path[1])]["free"]:
                             dist -= ALU_OUT_WEIGTH + 1
                 except nx.exception.NetworkXNoPath:
                     dist = PENALTY_CONST
-                dist_from_res[(v, o)][op] = dist
+                return dist
+
+        def estimated_dist(e, port):
+            if port in iport_list:
+                alu = CGRA.getNodeName("ALU", pos=mapping[e[1]])
+                return in_table[port].get(alu, PENALTY_CONST) + 1
+            else:
+                alu = CGRA.getNodeName("ALU", pos=mapping[e[0]])
+                if not alu in out_table[port]:
+                    return PENALTY_CONST
+                # the cost of ALU output may be excluded from the exact one
+                out_weight = max([CGRA.getLinkWeight(out_edge) \
+                                  for out_edge in routed_graph.out_edges(alu)] + [0])
+                return out_table[port][alu] - out_weight - 1
+
+        candidates = {e: iport_list for e in routed_in_edges}
+        candidates.update({e: oport_list for e in routed_out_edges})
+        return AStarRouter.__solve_assignment(
+                    lambda dist: AStarRouter.__assign_ioports(ioports, inodes, onodes, \
+                                                              routed_in_edges, routed_out_edges, dist),
+                    candidates, exact_dist, estimated_dist, cost_mode)
 
-        # make pulp problem
-        prob = pulp.LpProblem("Make_IO_Mapping", pulp.LpMinimize)
+    @staticmethod
+    def __assign_ioports(ioports, inodes, onodes, routed_in_edges, routed_out_edges, dist_from_res):
+        """Decides io-mapping from the distances.
+            Each input/output node is assigned to an inout port.
+            It is a linear assignment problem solved by Hungarian method.
 
-        # make pulp variables
-        # first index: input/output node, second input/output port
-        isInportMap = pulp.LpVariable.dicts("IPMAP", (inodes, iport_list), 0, 1, cat="Binary")
-        isOutportMap = pulp.LpVariable.dicts("OPMAP", (onodes, oport_list), 0, 1, cat="Binary")
+            Args:
+                ioport (list-like): list of ioport nodes name (tuple)
+                inodes (list-like): input nodes of app graph
+                onodes (list-like): output nodes of app graph
+                routed_in_edges (list-like): input edges to be routed
+                routed_out_edges (list-like): output edges to be routed
+                dist_from_res (dict): distance between each edge and port
+                    keys (tuple): edge
+                    values (dict): distance for each port
 
-        # define problem
-        prob += pulp.lpSum([isInportMap[e[0]][ip] * dist_from_res[e][ip] for e in routed_in_edges for ip in iport_list]) + \
-             pulp.lpSum([isOutportMap[e[1]][op] * dist_from_res[e][op] for e in routed_out_edges for op in oport_list])
+            Returns:
+                (tuple of dict, list): io-mapping (see __io_mapping),
+                                       chosen pairs of edge and port
+        """
+        iport_list = [x[0] for x in ioports]
+        oport_list = [x[1] for x in ioports]
 
-        # constraints
-        #   to ensure each edge is mapped to a port
-        for inode in inodes:
-            prob += pulp.lpSum([isInportMap[inode][ip] for ip in iport_list]) == 1
-        for onode in onodes:
-            prob += pulp.lpSum([isOutportMap[onode][op] for op in oport_list]) == 1
-        # to prevent overuse of inout port
-        for i in range(len(ioports)):
-            prob += pulp.lpSum([isInportMap[inode][iport_list[i]] for inode in inodes]) + \
-                        pulp.lpSum([isOutportMap[onode][oport_list[i]] for onode in onodes]) <= 1
+        #   row: input/output node, column: index of inout port
+        inodes = list(inodes)
+        onodes = list(onodes)
+        cost = np.array([[sum([dist_from_res[e][ip] for e in routed_in_edges if e[0] == inode]) \
+                          for ip in iport_list] for inode in inodes] + \
+                        [[sum([dist_from_res[e][op] for e in routed_out_edges if e[1] == onode]) \
+                          for op in oport_list] for onode in onodes]).reshape(-1, len(ioports))
+        rows, cols = linear_sum_assignment(cost)
+        port_index = dict(zip(rows, cols))
+
+        input_mapping = {iport_list[port_index[i]]: inode for i, inode in enumerate(inodes)}
+        output_mapping = {oport_list[port_index[len(inodes) + i]]: onode \
+                            for i, onode in enumerate(onodes)}
+        chosen = [(e, ip) for ip, inode in input_mapping.items() \
+                    for e in routed_in_edges if e[0] == inode] + \
+                 [(e, op) for op, onode in output_mapping.items() \
+                    for e in routed_out_edges if e[1] == onode]
+        return (input_mapping, output_mapping), chosen
 
-        # solve this ILP
-        stat = prob.solve(solver)
-        result = prob.objective.value()
+    @staticmethod
+    def __rest_budget(budget, cost):
+        """Returns the budget remaining after the cost is spent (None if no budget).
+        """
+        return None if budget is None else budget - cost
 
-        # check result
-        if pulp.LpStatus[stat] == "Optimal" and not result is None:
-            input_mapping = {}
-            for inode in inodes:
-                for ip in iport_list:
-                    if isInportMap[inode][ip].value() == 1.0:
-                        input_mapping[ip] = inode
-                        break
-            output_mapping = {}
-            for onode in onodes:
-                for op in oport_list:
-                    if isOutportMap[onode][op].value() == 1.0:
-                        output_mapping[op] = onode
-                        break
-            return (input_mapping, output_mapping)
-        else:
-            return None
+    @staticmethod
+    def __exceeds(graph, cost, budget, stage, src, dst):
+        """Checks whether the routing cost exceeds the budget.
+            If so, the failure is recorded.
+
+            Args:
+                graph (networkx DiGraph): A graph where the paths are routed
+                cost (int): routing cost
+                budget (int): routing cost budget (None if no budget)
+                stage (str): routing stage name
+                src (str): source node name of the net
+                dst (str): destination node name of the net
+
+            Returns:
+                bool: True if the cost exceeds the budget, otherwise False
+        """
+        if budget is None or cost <= budget:
+            return False
+        AStarRouter.record_failure(graph, stage, src, dst)
+        return True
 
     @staticmethod
     def __manhattan_dist(p1, p2):
@@ -576,6 +916,8 @@ class AStarRouter(RouterBase):
     @staticmethod
     def __find_nearest_node(graph, src, dsts):
         """Find the nearset node for src from dsts.
+            The nearest node is searched by a single multi-target search.
+            If some nodes are the nearest, the first one in dsts is chosen.
 
             Args:
                 src (str): source node
@@ -584,30 +926,19 @@ class AStarRouter(RouterBase):
             Returns:
                     (list, int): path, cost
         """
-        min_length = PENALTY_CONST
-        nearest_node = None
-        path_dict = {}
-
-        # find a nearest node greedy
-        for dst in dsts:
-            try:
-                path = nx.astar_path(graph, src, dst, weight="weight")
-                path_len = sum([graph.edges[(path[i], path[i+1])]["weight"]\
-                             for i in range(len(path) - 1)])
-                path_dict[dst] = path
-                if path_len < min_length:
-                    min_length = path_len
-                    nearest_node = dst
-            except nx.exception.NetworkXNoPath:
-                continue
-
-        if nearest_node is None:
+        try:
+            path, cost = graph.graph[STATE_KEY].findNearest(src, dsts, limit = PENALTY_CONST)
+        except nx.exception.NetworkXNoPath:
             return None, PENALTY_CONST
+
+        if cost < PENALTY_CONST:
+            return path, cost
         else:
-            return path_dict[nearest_node], min_length
+            return None, PENALTY_CONST
 
     @staticmethod
-    def __single_src_multi_dest_route(CGRA, graph, src, dsts):
+    def __single_src_multi_dest_route(CGRA, graph, src, dsts, fanout = FANOUT_MODES[0], \
+                                      budget = None, stage = None, fixed = None):
         """Routes a single source to multiple destinations.
 
             Args:
@@ -618,6 +949,15 @@ class AStarRouter(RouterBase):
                                 key:   dest node names
                                 value: operand attribute of the edge
                                         If the edge don't has this attributes, it is None
+                Option:
+                    fanout (str): fanout routing mode (see FANOUT_MODES)
+                    budget (int): routing cost budget
+                                  If the cost exceeds it, the remaining destinations
+                                  are not routed.
+                    stage (str): routing stage name to record the failure
+                    fixed (dict): paths to be reused if they are still available
+                                key:   dest node names
+                                value: path from the source
 
             Returns:
                 int: routing cost
@@ -625,55 +965,134 @@ class AStarRouter(RouterBase):
         # route each path
         shared_edges = set()
         route_cost = 0
+        # nodes from which the data of the source is available
+        tree = [src]
 
         if len(dsts) == 0:
             return 0
 
+        if fixed is None:
+            fixed = {}
+        else:
+            # the fixed paths go first so that the other paths can share them
+            dsts = {dst: dsts[dst] for dst in sorted(dsts.keys(), key=lambda v: not v in fixed)}
+
         for dst, operand in dsts.items():
             try:
-                # get path length by using astar
-                path = nx.astar_path(graph, src, dst, weight = "weight")
-                path_len = sum([graph.edges[(path[i], path[i+1])]["weight"]\
-                             for i in range(len(path) - 1)])
+                path = None
+                if dst in fixed:
+                    path, path_len = AStarRouter.__reuse_path(graph, fixed[dst], shared_edges)
+                if path is None:
+                    # get path length by using astar
+                    # paths exceeding ALU_OUT_WEIGTH are not searched since they are not used
+                    if fanout == "tree":
+                        path, path_len = graph.graph[STATE_KEY].findPathFrom(tree, dst, ALU_OUT_WEIGTH)
+                    else:
+                        path, path_len = AStarRouter.__find_path(graph, src, dst, ALU_OUT_WEIGTH)
 
                 if path_len > ALU_OUT_WEIGTH:
                     raise nx.exception.NetworkXNoPath
                 else:
                     route_cost += path_len
-                    # set used flag to the links
-                    for i in range(len(path) - 1):
-                        e = (path[i], path[i + 1])
-                        isSE = CGRA.isSE(e[1])
-                        isALU = CGRA.isALU(e[1])
-                        if isSE or (isALU and e[1] != path[-1]):
-                            # if the link is provided by SE, set cost 0
-                            # for path sharing
-                            shared_edges.add(e)
-                            graph.edges[e]["weight"] = 0
-                            # remove other input edges
-                            AStarRouter.__remove_other_edges(graph, path[i+1],\
-                                                                path[i])
-                            if isALU:
-                                graph.nodes[e[1]]["route"] = True
-                                graph.nodes[e[1]]["in_capacity"] = 0
-                        else:
-                            # other than SE's
-                            AStarRouter.__mark_used_edge(graph, e)
-
-                    # add operand attr
-                    if not operand is None:
-                        graph.edges[(path[-2], path[-1])]["operand"] = operand
-
-                    # check input capacity
-                    graph.nodes[dst]["in_capacity"] -= 1
-                    if graph.nodes[dst]["in_capacity"] == 0:
-                        AStarRouter.__disable_free_inedge(graph, dst)
+                    AStarRouter.__use_path(CGRA, graph, path, operand, shared_edges, \
+                                           tree if fanout == "tree" else None)
 
             except nx.exception.NetworkXNoPath:
                 # there is no path
                 # print("Fail:", src, "->", dst)
                 route_cost += PENALTY_CONST
 
+            if AStarRouter.__exceeds(graph, route_cost, budget, stage, src, dst):
+                # the remaining destinations are not routed
+                return route_cost
+
+        AStarRouter.__finish_source(graph, src, dsts, shared_edges)
+
+        return route_cost
+
+    @staticmethod
+    def __reuse_path(graph, path, shared_edges):
+        """Checks whether a path decided before is still available.
+
+            Args:
+                graph (networkx DiGraph): A graph where the paths are routed
+                path (list): node names of the path from the source
+                shared_edges (set): edges already routed for the source
+
+            Returns:
+                (list, int): the path and its cost if available, otherwise (None, None)
+        """
+        stats = graph.graph[STATS_KEY]
+        # the relay nodes must not be used by the other sources
+        if all([graph.nodes[v]["free"] for v in path[1:-1]]):
+            # the edges shared with the other paths of the source are free of charge
+            path_len = graph.graph[STATE_KEY].getPathCost(path, shared_edges)
+            if not path_len is None and path_len <= ALU_OUT_WEIGTH:
+                stats["reuse_hit"] = stats.get("reuse_hit", 0) + 1
+                return path, path_len
+        stats["reuse_miss"] = stats.get("reuse_miss", 0) + 1
+        return None, None
+
+    @staticmethod
+    def __use_path(CGRA, graph, path, operand, shared_edges, tree = None):
+        """Reflects a routed path on the graph.
+
+            Args:
+                CGRA (PEArrayModel): A model of the CGRA
+                graph (networkx DiGraph): A graph where the paths are routed
+                path (list): node names of the path to a destination
+                operand (str): operand attribute of the last edge (None if no operand)
+                shared_edges (set): edges shareable by the other paths of the source
+                                    Edges of this path are added.
+                Option:
+                    tree (list): nodes of the routing tree of the source
+                                 If it is given, branch nodes of this path are added.
+                                 Otherwise, the shareable edges get zero cost.
+        """
+        dst = path[-1]
+        # set used flag to the links
+        for i in range(len(path) - 1):
+            e = (path[i], path[i + 1])
+            isSE = CGRA.isSE(e[1])
+            isALU = CGRA.isALU(e[1])
+            if isSE or (isALU and e[1] != dst):
+                shared_edges.add(e)
+                if not tree is None:
+                    # the link can be a branch of the tree
+                    tree.append(e[1])
+                else:
+                    # if the link is provided by SE, set cost 0
+                    # for path sharing
+                    AStarRouter.__set_weight(graph, e, 0)
+                # remove other input edges
+                AStarRouter.__remove_other_edges(graph, path[i+1],\
+                                                    path[i])
+                if isALU:
+                    graph.nodes[e[1]]["route"] = True
+                    graph.nodes[e[1]]["in_capacity"] = 0
+            else:
+                # other than SE's
+                AStarRouter.__mark_used_edge(graph, e)
+
+        # add operand attr
+        if not operand is None:
+            graph.edges[(path[-2], path[-1])]["operand"] = operand
+
+        # check input capacity
+        graph.nodes[dst]["in_capacity"] -= 1
+        if graph.nodes[dst]["in_capacity"] == 0:
+            AStarRouter.__disable_free_inedge(graph, dst)
+
+    @staticmethod
+    def __finish_source(graph, src, dsts, shared_edges):
+        """Marks the resources used by a source as used.
+
+            Args:
+                graph (networkx DiGraph): A graph where the paths are routed
+                src (str): source node name
+                dsts (list-like): destination node names
+                shared_edges (set): shareable edges routed for the source
+        """
         # update SE edges link cost and used flag
         for e in shared_edges:
             AStarRouter.__mark_used_edge(graph, e)
@@ -686,11 +1105,62 @@ class AStarRouter(RouterBase):
         for v in dsts:
             graph.nodes[v]["free"] = False
 
-        return route_cost
+    @staticmethod
+    def route_fixed_paths(CGRA, routed_graph, src, paths, dsts):
+        """Reflects paths decided by another routing algorithm on the routed graph.
+            The graph is updated in the same way as the routing by this class,
+            so that the other routing stages can be done by this class.
+
+            Args:
+                CGRA (PEArrayModel): A model of the CGRA
+                routed_graph (networkx DiGraph): A graph where the paths are routed
+                src (str): source node name
+                paths (list): paths from the source (or its routing tree)
+                              to destinations in the routing order
+                              Each element is a tuple of (path, operand).
+                dsts (list-like): all destination node names of the source
+                                  including failed ones
+
+            Returns: None
+        """
+        AStarRouter.__get_state(CGRA, routed_graph)
+        shared_edges = set()
+        for path, operand in paths:
+            AStarRouter.__use_path(CGRA, routed_graph, path, operand, shared_edges, [])
+        AStarRouter.__finish_source(routed_graph, src, dsts, shared_edges)
+
+    @staticmethod
+    def init_comp_routing(CGRA, mapping, routed_graph, **info):
+        """Initializes the routed graph for the computation routing.
+            It is necessary for other routers using route_fixed_paths
+            instead of comp_routing.
+
+            Args:
+                CGRA (PEArrayModel): A model of the CGRA
+                mapping (dict): mapping of the DFG
+                    keys (str): operation label of DFG
+                    values (tuple): PE coordinates
+                routed_graph (networkx DiGraph): A graph where the paths are routed
+                Option:
+                    info: router options
+
+            Returns:
+                RoutingState: the routing state of the routed graph
+        """
+        state = AStarRouter.__get_state(CGRA, routed_graph, info)
+        AStarRouter.__init_ALU(CGRA, mapping, routed_graph)
+        return state
 
     @staticmethod
     def clean_graph(graph):
         """Cleaning graph"""
+        # the routing state is no longer necessary
+        graph.graph.pop(STATE_KEY, None)
+        if isinstance(graph, OverlayGraph):
+            # copy only the used nodes and edges from the base network
+            graph.detach([v for v, attr in graph.peekNodes() if attr["free"] != True], \
+                         [(u, v) for u, v, attr in graph.peekEdges() if attr["free"] != True])
+            return
         remove_edges = [e for e in graph.edges() if graph.edges[e]["free"] == True]
         graph.remove_edges_from(remove_edges)
         remove_nodes = [v for v in graph.nodes() if graph.nodes[v]["free"] == True]
@@ -0,0 +1,587 @@
+#  This file is part of GenMap and released under the MIT License, see LICENSE.
+#  Author: Takuya Kojima
+
+import networkx as nx
+import numpy as np
+from heapq import heappush, heappop
+from OverlayGraph import OverlayGraph
+from itertools import count
+
+class CompiledNetwork():
+    def __init__(self, network, positions = None, lower_weights = None):
+        """Integer-indexed representation of a PE array network.
+            Nodes are numbered and the edges are stored in CSR format
+            with the same order as the adjacency of the networkx graph.
+
+            Args:
+                network (networkx DiGraph): PE array network
+                    Each edge must have "weight" attribute.
+                Option:
+                    positions (dict): PE coordinates of the nodes for A* heuristic
+                        keys (str): node names
+                        values (tuple): PE coordinates
+                        Nodes without coordinates must not be relay nodes
+                        (i.e. they have only either incoming or outgoing edges).
+                    lower_weights (dict): lower bounds of the edge weights in routed graphs
+                        keys (tuple of str): edges
+                        values (int or float): the lower bounds
+                        Weights of the network are used for missing edges.
+        """
+        if positions is None:
+            positions = {}
+        self.names = list(network.nodes())
+        self.ids = {v: i for i, v in enumerate(self.names)}
+
+        # outgoing edges
+        indptr = [0]
+        edges = []
+        weight = []
+        for u in self.names:
+            for v, attr in network.succ[u].items():
+                edges.append((u, v))
+                weight.append(attr["weight"])
+            indptr.append(len(edges))
+        self.edges = edges
+        self.edge_ids = {e: i for i, e in enumerate(edges)}
+        self.indptr = np.array(indptr, dtype = np.int32)
+        self.indices = np.array([self.ids[v] for _, v in edges], dtype = np.int32)
+        # keep integer weights as they are to get the same routing cost
+        if all([isinstance(w, (int, np.integer)) for w in weight]):
+            self.weight = np.array(weight, dtype = np.int64)
+        else:
+            self.weight = np.array(weight, dtype = np.float64)
+        if lower_weights is None:
+            lower_weights = {}
+        self.lower_weight = np.minimum(self.weight, \
+                                       [lower_weights.get(e, w) for e, w in zip(edges, weight)])
+
+        # adjacency list of (neighbor id, edge id) for the path finding
+        self.adjacency = [list(zip(self.indices[s:e].tolist(), range(s, e))) \
+                            for s, e in zip(indptr[:-1], indptr[1:])]
+
+        # coordinates of the nodes (None for nodes without coordinates)
+        self.positions = [positions.get(v) for v in self.names]
+        # coordinates to be reached for each destination node
+        # for nodes without coordinates, those of the predecessors are used
+        self.goals = []
+        for v, pos in zip(self.names, self.positions):
+            if pos is None:
+                pos_set = set([positions[u] for u in network.pred[v] if u in positions])
+                self.goals.append(sorted(pos_set))
+            else:
+                self.goals.append([pos])
+        # coordinates to be covered by search windows for each node
+        # for nodes without coordinates, those of the neighbors are used
+        self.anchors = []
+        for v, pos in zip(self.names, self.positions):
+            if pos is None:
+                pos_set = set([positions[u] for u in network.pred[v] if u in positions])
+                pos_set |= set([positions[u] for u in network.succ[v] if u in positions])
+                self.anchors.append(sorted(pos_set))
+            else:
+                self.anchors.append([pos])
+        # range of the coordinates (xmin, xmax, ymin, ymax)
+        if len(positions) > 0:
+            xs = [x for x, _ in positions.values()]
+            ys = [y for _, y in positions.values()]
+            self.bounds = (min(xs), max(xs), min(ys), max(ys))
+        else:
+            self.bounds = None
+        # manhattan distance moved by each edge
+        step = [0 if positions.get(u) is None or positions.get(v) is None else \
+                abs(positions[u][0] - positions[v][0]) + abs(positions[u][1] - positions[v][1]) \
+                for u, v in edges]
+        self.step_edges = np.array(step, dtype = np.int32) > 0
+        self.max_step = max(step + [1])
+        # lower bound of the number of edges moving between PEs to reach each target
+        #   key: target node id
+        #   value: list of the lower bound for each node
+        self.__hops = {}
+        # shortest path trees on the network weighted by the lower bounds
+        #   key: source node id
+        #   value: (parent node ids, parent edge ids, distances)
+        self.__trees = {}
+
+    def getHops(self, target):
+        """Returns lower bounds of the number of edges moving between PEs
+            from each node to the target.
+            It is calculated from the manhattan distance at the first call.
+
+            Args:
+                target (int): node id of the target
+
+            Returns:
+                list: the lower bound for each node
+                      None if the target has no coordinate to be reached
+        """
+        if not target in self.__hops:
+            goals = self.goals[target]
+            if len(goals) == 0:
+                self.__hops[target] = None
+            else:
+                hops = []
+                for pos in self.positions:
+                    if pos is None:
+                        hops.append(0)
+                    else:
+                        dist = min([abs(pos[0] - x) + abs(pos[1] - y) for x, y in goals])
+                        hops.append((dist + self.max_step - 1) // self.max_step)
+                self.__hops[target] = hops
+        return self.__hops[target]
+
+    def getShortestPathTree(self, source):
+        """Returns the shortest path tree from a node on the network
+            weighted by the lower bounds of the edge weights.
+            It is calculated by Dijkstra's algorithm at the first call for each source.
+            The paths in the tree are used as templates of the routing.
+
+            Args:
+                source (int): node id of the source
+
+            Returns:
+                (list, list, list): parent node id for each node,
+                                    edge id from the parent for each node
+                                    (-1 for the source and unreachable nodes),
+                                    distance from the source for each node
+                                    (None for unreachable nodes)
+        """
+        if not source in self.__trees:
+            weight = self.lower_weight.tolist()
+            parent = [-1] * len(self.names)
+            parent_edge = [-1] * len(self.names)
+            dist = [None] * len(self.names)
+            settled = [False] * len(self.names)
+            dist[source] = 0
+            c = count()
+            queue = [(0, next(c), source)]
+            while queue:
+                d, __, cur = heappop(queue)
+                if settled[cur]:
+                    continue
+                settled[cur] = True
+                for neighbor, i in self.adjacency[cur]:
+                    nd = d + weight[i]
+                    if settled[neighbor] or (not dist[neighbor] is None and dist[neighbor] <= nd):
+                        continue
+                    dist[neighbor] = nd
+                    parent[neighbor] = cur
+                    parent_edge[neighbor] = i
+                    heappush(queue, (nd, next(c), neighbor))
+            self.__trees[source] = (parent, parent_edge, dist)
+        return self.__trees[source]
+
+    def getWindow(self, nodes, margin):
+        """Returns a search window, which is the bounding box of the nodes
+            extended by the margin.
+
+            Args:
+                nodes (list): node ids to be covered
+                margin (int): margin of the bounding box
+
+            Returns:
+                tuple: (xmin, xmax, ymin, ymax) of the window
+                       None if the window covers the whole network
+        """
+        anchors = [pos for v in nodes for pos in self.anchors[v]]
+        if len(anchors) == 0 or self.bounds is None:
+            return None
+        window = (min([x for x, _ in anchors]) - margin, max([x for x, _ in anchors]) + margin, \
+                  min([y for _, y in anchors]) - margin, max([y for _, y in anchors]) + margin)
+        xmin, xmax, ymin, ymax = self.bounds
+        if window[0] <= xmin and window[1] >= xmax and window[2] <= ymin and window[3] >= ymax:
+            return None
+        return window
+
+    def nodeCount(self):
+        return len(self.names)
+
+    def edgeCount(self):
+        return len(self.edges)
+
+class RoutingState():
+    def __init__(self, compiled, graph):
+        """Routing state of a graph made from a PE array network.
+            It keeps weights and flags of the edges as numpy arrays
+            indexed by the edge ids of the compiled network.
+
+            Args:
+                compiled (CompiledNetwork): compiled PE array network
+                graph (networkx DiGraph): a graph to be routed
+                    It must be a (possibly modified) copy of the network
+                    from which the compiled network is made.
+        """
+        self.compiled = compiled
+        size = compiled.edgeCount()
+        self.weight = compiled.weight.copy()
+        # whether the edge remains in the graph
+        self.alive = np.zeros(size, dtype = bool)
+        # whether the edge is not used by any route
+        self.free = np.ones(size, dtype = bool)
+        # the number of searches answered by the templates and the other ones
+        self.stats = {"template_hit": 0, "template_miss": 0}
+        # margin of the search windows (None to search the whole network)
+        self.margin = None
+
+        # the attributes are only read
+        if isinstance(graph, OverlayGraph):
+            succ = {u: graph.peekSucc(u) for u in compiled.names if graph.has_node(u)}
+        else:
+            succ = graph.succ
+        if graph.number_of_edges() == size and len(succ) == compiled.nodeCount():
+            # no edge is removed, so the edges are in the same order
+            attrs = [attr for u in compiled.names for attr in succ[u].values()]
+            self.alive[:] = True
+            self.weight[:] = [attr["weight"] for attr in attrs]
+            self.free[:] = [attr.get("free", True) for attr in attrs]
+        else:
+            for i, (u, v) in enumerate(compiled.edges):
+                if not u in succ:
+                    continue
+                attr = succ[u].get(v)
+                if attr is None:
+                    continue
+                self.alive[i] = True
+                self.weight[i] = attr["weight"]
+                self.free[i] = attr.get("free", True)
+
+        # the number of edges whose weights are less than the lower bounds
+        # (e.g. edges shared by paths from the same source)
+        # the templates are not optimal while there are such edges
+        self.__discounted = int(np.count_nonzero(self.weight < compiled.lower_weight))
+
+        # snapshot of the arrays as lists for fast element access
+        # and the minimum weight of the edges moving between PEs
+        self.__snapshot = None
+
+    def setWeight(self, e, weight):
+        """Sets weight of an edge.
+
+            Args:
+                e (tuple of str): the edge
+                weight (int or float): new weight
+        """
+        self.__update_weight(self.compiled.edge_ids[e], weight)
+        self.__snapshot = None
+
+    def setUsed(self, e, weight):
+        """Marks an edge as used.
+
+            Args:
+                e (tuple of str): the edge
+                weight (int or float): new weight
+        """
+        i = self.compiled.edge_ids[e]
+        self.__update_weight(i, weight)
+        self.free[i] = False
+        self.__snapshot = None
+
+    def __update_weight(self, i, weight):
+        lower = self.compiled.lower_weight[i]
+        self.__discounted += int(weight < lower) - int(self.weight[i] < lower)
+        self.weight[i] = weight
+
+    def removeEdge(self, e):
+        self.alive[self.compiled.edge_ids[e]] = False
+        self.__snapshot = None
+
+    def getPathCost(self, path, skip = ()):
+        """Returns the cost of a path with the current weights.
+
+            Args:
+                path (list): node names of the path
+                Option:
+                    skip (set): edges excluded from the cost
+
+            Returns:
+                int or float: the cost (None if some edges of the path are removed)
+        """
+        edge_ids = self.compiled.edge_ids
+        cost = 0
+        for e in zip(path[:-1], path[1:]):
+            i = edge_ids.get(e)
+            if i is None or not self.alive[i]:
+                return None
+            if not e in skip:
+                cost += self.weight[i].item()
+        return cost
+
+    def findPath(self, src, dst, limit = None):
+        """Finds the shortest path by A* search.
+            The search order is the same as networkx.astar_path
+            with the heuristic based on the PE coordinates.
+            If the template path (the shortest path on the network weighted
+            by the lower bounds) is still available with the lower bound weights,
+            it is returned without the search.
+
+            Args:
+                src (str): source node name
+                dst (str): destination node name
+                Option:
+                    limit (int or float): paths whose costs exceed
+                                          the limit are not searched
+
+            Returns:
+                (list, int or float): node names of the path, its cost
+
+            Raise:
+                networkx.NodeNotFound: if src or dst is not in the network
+                networkx.NetworkXNoPath: if there is no path
+        """
+        ids = self.compiled.ids
+        if not src in ids or not dst in ids:
+            raise nx.NodeNotFound("Either source {0} or target {1} is not in G".format(src, dst))
+
+        target = ids[dst]
+        found, result = self.__template_path(ids[src], target, limit)
+        if not found:
+            # consistent heuristic: the lower bound of the number of edges moving
+            # between PEs multiplied by the minimum weight of such edges
+            hops = self.compiled.getHops(target)
+            result = self.__windowed_search([ids[src]], {target: 0}, hops, limit)
+        if result is None:
+            raise nx.NetworkXNoPath("Node {0} not reachable from {1}".format(dst, src))
+        return result
+
+    def findPathFrom(self, srcs, dst, limit = None, weight = None):
+        """Finds the shortest path from the nearest source by a single A* search.
+            It is used to connect a destination to a routing tree.
+
+            Args:
+                srcs (list-like): source node names
+                dst (str): destination node name
+                Option:
+                    limit (int or float): paths whose costs exceed
+                                          the limit are not searched
+                    weight (numpy.ndarray): edge weights used instead of
+                                            the current weights (e.g. for
+                                            congestion-aware routing)
+
+            Returns:
+                (list, int or float): node names of the path, its cost
+                    The path starts from one of the sources.
+
+            Raise:
+                networkx.NodeNotFound: if a node is not in the network
+                networkx.NetworkXNoPath: if there is no path
+        """
+        ids = self.compiled.ids
+        for v in list(srcs) + [dst]:
+            if not v in ids:
+                raise nx.NodeNotFound("Node {0} is not in G".format(v))
+
+        target = ids[dst]
+        found = False
+        if len(srcs) == 1 and weight is None:
+            found, result = self.__template_path(ids[srcs[0]], target, limit)
+        if not found:
+            result = self.__windowed_search([ids[src] for src in srcs], {target: 0}, \
+                                            self.compiled.getHops(target), limit, weight)
+        if result is None:
+            raise nx.NetworkXNoPath("Node {0} not reachable from the sources".format(dst))
+        return result
+
+    def findNearest(self, src, dsts, limit = None):
+        """Finds the nearest destination and the shortest path to it
+            by a single A* search stopping at the first reached destination.
+            If some destinations are the nearest, the first one in dsts is chosen.
+
+            Args:
+                src (str): source node name
+                dsts (list-like): destination node names
+                Option:
+                    limit (int or float): paths whose costs exceed
+                                          the limit are not searched
+
+            Returns:
+                (list, int or float): node names of the path, its cost
+
+            Raise:
+                networkx.NodeNotFound: if src is not in the network
+                networkx.NetworkXNoPath: if there is no path
+        """
+        ids = self.compiled.ids
+        if not src in ids:
+            raise nx.NodeNotFound("Source {0} is not in G".format(src))
+
+        #   key: target node id
+        #   value: order in dsts
+        targets = {}
+        for dst in dsts:
+            if dst in ids and not ids[dst] in targets:
+                targets[ids[dst]] = len(targets)
+
+        # the minimum of the heuristic for each destination is also consistent
+        hops_list = [self.compiled.getHops(target) for target in targets]
+        if len(hops_list) == 0 or any([hops is None for hops in hops_list]):
+            hops = None
+        elif len(hops_list) == 1:
+            hops = hops_list[0]
+        else:
+            hops = np.array(hops_list).min(axis = 0).tolist()
+
+        result = self.__windowed_search([ids[src]], targets, hops, limit)
+        if result is None:
+            raise nx.NetworkXNoPath("No destination is reachable from {0}".format(src))
+        return result
+
+    def __template_path(self, source, target, limit):
+        """Gets the template path if it is the shortest path on the current graph.
+            It is the case when all edges of the path remain with the lower bound
+            weights and no edge is cheaper than the lower bound.
+
+            Args:
+                source (int): node id of the source
+                target (int): node id of the target
+                limit (int or float): upper limit of the path cost (None for no limit)
+
+            Returns:
+                (bool, tuple): whether the template is available,
+                               (node names of the path, its cost) or None if there is no path
+        """
+        if self.__discounted > 0:
+            self.stats["template_miss"] += 1
+            return False, None
+        parent, parent_edge, dist = self.compiled.getShortestPathTree(source)
+        cost = dist[target]
+        if cost is None or (not limit is None and cost > limit):
+            # not reachable even with the lower bounds
+            self.stats["template_hit"] += 1
+            return True, None
+
+        if self.__snapshot is None:
+            self.__snapshot = self.__snapshot_of(self.weight)
+        weight, alive, _ = self.__snapshot
+        lower = self.compiled.lower_weight
+        path = [target]
+        node = target
+        while node != source:
+            i = parent_edge[node]
+            if not alive[i] or weight[i] != lower[i]:
+                self.stats["template_miss"] += 1
+                return False, None
+            node = parent[node]
+            path.append(node)
+
+        self.stats["template_hit"] += 1
+        names = self.compiled.names
+        return True, ([names[v] for v in reversed(path)], cost)
+
+    def __snapshot_of(self, weight):
+        """Makes a snapshot of the edge weights as lists for fast element access.
+
+            Args:
+                weight (numpy.ndarray): edge weights
+
+            Returns:
+                (list, list, int or float): weights, alive flags,
+                                            the minimum weight of the edges moving between PEs
+        """
+        step_weight = weight[self.compiled.step_edges & self.alive]
+        step_weight = step_weight.min().item() if len(step_weight) > 0 else 0
+        return (weight.tolist(), self.alive.tolist(), step_weight)
+
+    def __windowed_search(self, sources, targets, hops, limit = None, weight = None):
+        """Searches the shortest path in the bounding box of the sources and the targets
+            extended by the margin. If there is no path in the window,
+            the margin is doubled until the window covers the whole network.
+            The arguments and the return value are the same as __search.
+        """
+        if self.margin is None:
+            return self.__search(sources, targets, hops, limit, weight)
+        nodes = list(sources) + list(targets)
+        margin = self.margin
+        while True:
+            window = self.compiled.getWindow(nodes, margin)
+            result = self.__search(sources, targets, hops, limit, weight, window)
+            if not result is None or window is None:
+                return result
+            margin = max(1, margin * 2)
+
+    def __search(self, sources, targets, hops, limit = None, weight = None, window = None):
+        """Searches the shortest path from the sources to the nearest target.
+
+            Args:
+                sources (list): node ids of the sources
+                targets (dict): node ids of the targets and their priority
+                                (smaller is prior among the nearest targets)
+                hops (list): lower bounds of the number of edges moving between PEs
+                             to the targets (None to disable the heuristic)
+                Option:
+                    limit (int or float): upper limit of the path cost
+                    weight (numpy.ndarray): edge weights instead of the current ones
+                    window (tuple): (xmin, xmax, ymin, ymax) of the search window
+                                    Nodes outside the window are not explored.
+
+            Returns:
+                (list, int or float): node names of the path, its cost
+                                      None if there is no path
+        """
+        if not weight is None:
+            weight, alive, step_weight = self.__snapshot_of(weight)
+        else:
+            if self.__snapshot is None:
+                self.__snapshot = self.__snapshot_of(self.weight)
+            weight, alive, step_weight = self.__snapshot
+        adjacency = self.compiled.adjacency
+        positions = self.compiled.positions
+        if step_weight <= 0:
+            hops = None
+
+        # parent of explored nodes (-2 means unexplored)
+        explored = [-2] * len(adjacency)
+        # cost and heuristic value of the enqueued nodes
+        enqueued = {}
+        c = count()
+        queue = [(0, next(c), source, 0, -1) for source in sources]
+        # reached target and its cost
+        best = None
+
+        while queue:
+            priority, __, cur, dist, parent = heappop(queue)
+
+            if not best is None and priority > best[1]:
+                # no other target can be reached with the same cost
+                break
+            if not limit is None and priority > limit:
+                break
+            if explored[cur] != -2:
+                continue
+            explored[cur] = parent
+
+            if cur in targets:
+                if best is None or targets[cur] < targets[best[0]]:
+                    best = (cur, dist)
+                if targets[best[0]] == 0:
+                    break
+
+            for neighbor, i in adjacency[cur]:
+                if not alive[i] or explored[neighbor] != -2:
+                    continue
+                if not window is None:
+                    pos = positions[neighbor]
+                    if not pos is None and not (window[0] <= pos[0] <= window[1] and \
+                                                window[2] <= pos[1] <= window[3]):
+                        continue
+                ncost = dist + weight[i]
+                if neighbor in enqueued:
+                    qcost, h = enqueued[neighbor]
+                    if qcost <= ncost:
+                        continue
+                elif hops is None:
+                    h = 0
+                else:
+                    h = step_weight * hops[neighbor]
+                enqueued[neighbor] = ncost, h
+                heappush(queue, (ncost + h, next(c), neighbor, ncost, cur))
+
+        if best is None:
+            return None
+
+        names = self.compiled.names
+        path = []
+        node = best[0]
+        while node != -1:
+            path.append(names[node])
+            node = explored[node]
+        path.reverse()
+        return path, best[1]
@@ -82,11 +82,9 @@ class ConfDrawer():
 
 
         for v in individual.routed_graph.nodes():
-            for x in range(self.width):
-                for y in range(self.height):
-                    if v in self.PE_resources[x][y]:
-                        self.used_PE[x][y] = True
-                        break
+            if v in self.node_pos:
+                (x, y) = self.node_pos[v]
+                self.used_PE[x][y] = True
             if CGRA.isIN_PORT(v):
                 self.used_input[v] = {}
             if CGRA.isOUT_PORT(v):
@@ -360,23 +358,21 @@ class ConfDrawer():
         # add ALUs & SEs
         routing_alus = []
         for v in individual.routed_graph.nodes():
-            for x in range(self.width):
-                for y in range(self.height):
-                    if v in self.PE_resources[x][y]:
-                        if CGRA.isALU(v):
-                            alu = self.__make_ALU_patch(self.coord_remap((x, y)))
-                            self.ax.add_patch(alu)
-                            self.node_to_patch[v] = alu
-                            if "route" in individual.routed_graph.nodes[v].keys():
-                                if individual.routed_graph.nodes[v]["route"]:
-                                    # routing alu
-                                    routing_alus.append((x, y))
-                        else:
-                            for SE_id, SEs in CGRA.get_PE_resources((x, y))["SE"].items():
-                                if v in SEs:
-                                    se = self.__make_SE_patch(self.coord_remap((x, y)), SE_id)
-                                    self.ax.add_patch(se)
-                                    self.node_to_patch[v] = se
+            if not v in self.node_pos:
+                continue
+            (x, y) = self.node_pos[v]
+            if CGRA.isALU(v):
+                alu = self.__make_ALU_patch(self.coord_remap((x, y)))
+                self.ax.add_patch(alu)
+                self.node_to_patch[v] = alu
+                if "route" in individual.routed_graph.nodes[v].keys():
+                    if individual.routed_graph.nodes[v]["route"]:
+                        # routing alu
+                        routing_alus.append((x, y))
+            else:
+                se = self.__make_SE_patch(self.coord_remap((x, y)), CGRA.getSEId(v))
+                self.ax.add_patch(se)
+                self.node_to_patch[v] = se
 
         # add op labels
         dfg = app.getCompSubGraph()
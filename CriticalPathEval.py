@@ -1,7 +1,7 @@
 #  This file is part of GenMap and released under the MIT License, see LICENSE.
 #  Author: Takuya Kojima
 
-from EvalBase import EvalBase
+from EvalBase import EvalBase, COST_MODERATE
 from DataPathAnalysis import DataPathAnalysis
 
 class CriticalPathEval(EvalBase):
@@ -30,4 +30,8 @@ class CriticalPathEval(EvalBase):
 
     @staticmethod
     def name():
-        return "Critical_Path"
\ No newline at end of file
+        return "Critical_Path"
+
+    @staticmethod
+    def costClass():
+        return COST_MODERATE
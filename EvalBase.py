@@ -3,6 +3,12 @@
 
 from abc import ABCMeta, abstractmethod
 
+# cost classes of objectives
+#   cheaper objectives are evaluated earlier
+COST_CHEAP = 0
+COST_MODERATE = 1
+COST_EXPENSIVE = 2
+
 class EvalBase(metaclass=ABCMeta):
     @staticmethod
     @abstractmethod
@@ -34,3 +40,47 @@ class EvalBase(metaclass=ABCMeta):
         """Returns the evaluation name
         """
         pass
+
+    # The following methods are optional declarations for evaluation scheduling.
+    # See EvalScheduler for the details.
+
+    @staticmethod
+    def costClass():
+        """Returns the cost class of this objective
+            (COST_CHEAP, COST_MODERATE, or COST_EXPENSIVE).
+        """
+        return COST_MODERATE
+
+    @staticmethod
+    def dependencies(**info):
+        """Returns class names of objectives which must be evaluated before this one.
+            If one of them is not enabled, the optimization setting is rejected.
+
+            Args:
+                info: the same options as eval
+        """
+        return []
+
+    @staticmethod
+    def optionalDependencies(**info):
+        """Returns class names of objectives which must be evaluated before this one
+            only if they are enabled.
+
+            Args:
+                info: the same options as eval
+        """
+        return []
+
+    @staticmethod
+    def mayInvalidate():
+        """Returns whether this objective may invalidate an individual.
+        """
+        return False
+
+    @staticmethod
+    def penaltyValue():
+        """Returns the value which this objective always returns for an invalid individual.
+            If it is not None, the evaluation is skipped for invalid individuals.
+            If None, this objective is always evaluated.
+        """
+        return None
@@ -0,0 +1,118 @@
+#  This file is part of GenMap and released under the MIT License, see LICENSE.
+#  Author: Takuya Kojima
+
+import networkx as nx
+from time import time
+
+# interval of evaluations to update the evaluation order
+RESCHEDULE_INTERVAL = 100
+
+class EvalScheduler():
+    def __init__(self, eval_list, eval_args):
+        """Constructor of the EvalScheduler class.
+            It decides the evaluation order of the objectives as follows:
+                1. An objective is evaluated after its dependencies.
+                2. An objective which may invalidate individuals is evaluated
+                   before the objectives having a penalty value, so that
+                   the penalty is filled once an individual is known invalid.
+                3. The others are ordered by the cost class and
+                   the measured evaluation time.
+            Since rule 3 never reorders objectives affecting each other,
+            the evaluated values do not depend on the measured time.
+
+            Args:
+                eval_list (list of EvalBase): objectives
+                eval_args (list of dict): options for each objective
+
+            Raise:
+                ValueError: if a dependency is not satisfied or is cyclic
+        """
+        self.__eval_list = eval_list
+        self.__eval_args = eval_args
+
+        names = [evl.__name__ for evl in eval_list]
+        order_graph = nx.DiGraph()
+        order_graph.add_nodes_from(range(len(eval_list)))
+
+        # declared dependencies
+        for i, (evl, args) in enumerate(zip(eval_list, eval_args)):
+            for dep in evl.dependencies(**args):
+                if not dep in names:
+                    raise ValueError("{0} requires {1} to be enabled".format(names[i], dep))
+                order_graph.add_edge(names.index(dep), i)
+            for dep in evl.optionalDependencies(**args):
+                if dep in names:
+                    order_graph.add_edge(names.index(dep), i)
+        if not nx.is_directed_acyclic_graph(order_graph):
+            raise ValueError("Dependencies among the objectives are cyclic")
+
+        # validity dependencies
+        for i, evl in enumerate(eval_list):
+            if not evl.mayInvalidate():
+                continue
+            for j, other in enumerate(eval_list):
+                if i == j or other.penaltyValue() is None:
+                    continue
+                # explicit dependencies have priority
+                # (if both may invalidate, the former one in the list goes first)
+                if not nx.has_path(order_graph, j, i):
+                    order_graph.add_edge(i, j)
+
+        self.__order_graph = order_graph
+
+        # average evaluation time for each objective
+        self.__eval_time = [0.0] * len(eval_list)
+        self.__eval_count = [0] * len(eval_list)
+        self.__total_count = 0
+        self.__order = self.__schedule()
+
+    def __schedule(self):
+        """Decides the evaluation order.
+
+            Returns:
+                list: indices of the objectives in the evaluation order
+        """
+        return list(nx.lexicographical_topological_sort(self.__order_graph, \
+                        key = lambda i: (self.__eval_list[i].costClass(), \
+                                         self.__eval_time[i], i)))
+
+    def getOrder(self):
+        """Returns the current evaluation order.
+
+            Returns:
+                list: objective classes in the evaluation order
+        """
+        return [self.__eval_list[i] for i in self.__order]
+
+    def evaluate(self, CGRA, app, sim_params, individual):
+        """Evaluates all the objectives for an individual.
+            The objectives having a penalty value are not evaluated
+            once the individual gets invalid.
+
+            Args:
+                CGRA (PEArrayModel): A model of the CGRA
+                app (Application): An application to be optimized
+                sim_params (SimParameters): parameters for some simulations
+                individual (Individual): An individual to be evaluated
+
+            Returns:
+                list: fitness in the order of the objectives in the configuration
+        """
+        fitness = [None] * len(self.__eval_list)
+        for i in self.__order:
+            evl = self.__eval_list[i]
+            penalty = evl.penaltyValue()
+            if not penalty is None and not individual.isValid():
+                fitness[i] = penalty
+                continue
+            start = time()
+            fitness[i] = evl.eval(CGRA, app, sim_params, individual, **self.__eval_args[i])
+            # update average time
+            self.__eval_count[i] += 1
+            self.__eval_time[i] += (time() - start - self.__eval_time[i]) / self.__eval_count[i]
+
+        self.__total_count += 1
+        if self.__total_count % RESCHEDULE_INTERVAL == 0:
+            self.__order = self.__schedule()
+
+        return fitness
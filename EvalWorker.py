@@ -0,0 +1,122 @@
+#  This file is part of GenMap and released under the MIT License, see LICENSE.
+#  Author: Takuya Kojima
+
+# Worker daemon for distributed evaluation
+#   It receives the evaluation context from a master (GenMap.py with --workers option)
+#   only once for each connection, and then evaluates genomes sent by the master.
+#   The master is authenticated with the key in the environment variable GENMAP_AUTHKEY
+#   before anything sent by it is unpickled.
+
+from RemoteEvaluator import parse_address, send_message, recv_message, \
+                            get_authkey, is_loopback, deliver_challenge, \
+                            AUTHKEY_ENV, AUTH_TIMEOUT
+
+# standard libs
+from argparse import ArgumentParser
+import multiprocessing
+import threading
+import socket
+import pickle
+import sys
+import os
+
+def parser():
+    usage = 'Usage: python3 {0} [options...] address'.format(__file__)
+    argparser = ArgumentParser(usage=usage)
+    argparser.add_argument("address", type=str, \
+                            help="address to listen (host:port for TCP, otherwise unix domain socket path)")
+    argparser.add_argument("--nproc", type=int, help="specify the number of multi-process (default: cpu count)", \
+                            default=multiprocessing.cpu_count())
+    args = argparser.parse_args()
+    return args
+
+def serve(conn, proc_num, authkey = None):
+    """Evaluates tasks sent by a master until the connection is closed.
+
+        Args:
+            conn (socket.socket): connection to the master
+            proc_num (int): the number of process
+            Optional:
+                authkey (bytes): authentication key for the master
+    """
+    try:
+        conn.settimeout(AUTH_TIMEOUT)
+        deliver_challenge(conn, authkey)
+        conn.settimeout(None)
+        _, initializer, initargs = recv_message(conn)
+    except (OSError, EOFError) as e:
+        print("Rejected the master:", e, file=sys.stderr)
+        conn.close()
+        return
+    pool = multiprocessing.Pool(proc_num, initializer=initializer, initargs=initargs)
+    send_message(conn, ("ready", proc_num))
+
+    # results are sent from the callback threads of the pool
+    send_lock = threading.Lock()
+    def reply(msg):
+        with send_lock:
+            try:
+                try:
+                    send_message(conn, msg)
+                except (pickle.PicklingError, TypeError, AttributeError) as e:
+                    # the result cannot be sent as it is
+                    send_message(conn, (msg[0], False, RuntimeError(repr(msg[2]))))
+            except OSError:
+                # the master has gone
+                pass
+
+    try:
+        while True:
+            msg = recv_message(conn)
+            if msg[0] == "eval":
+                _, task_id, func, args = msg
+                pool.apply_async(func, args, \
+                                 callback=lambda v, t=task_id: reply((t, True, v)), \
+                                 error_callback=lambda e, t=task_id: reply((t, False, e)))
+    except (OSError, EOFError):
+        pass
+    finally:
+        pool.terminate()
+        pool.join()
+        conn.close()
+
+if __name__ == '__main__':
+    args = parser()
+
+    family, addr = parse_address(args.address)
+    authkey = get_authkey()
+    if authkey is None and family == socket.AF_INET and not is_loopback(addr):
+        # anyone who can connect to the worker can run arbitrary code on it
+        print("Listening on a non-loopback address requires an authentication key " + \
+              "(set {0})".format(AUTHKEY_ENV), file=sys.stderr)
+        exit()
+
+    if family == socket.AF_UNIX and os.path.exists(addr):
+        os.remove(addr)
+
+    server = socket.socket(family, socket.SOCK_STREAM)
+    if family == socket.AF_INET:
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    try:
+        server.bind(addr)
+    except OSError as e:
+        print("Fail to listen {0}:".format(args.address), e, file=sys.stderr)
+        exit()
+    server.listen(1)
+    print("Waiting for a master at", args.address)
+
+    try:
+        # serve masters one by one
+        while True:
+            conn, peer = server.accept()
+            if family == socket.AF_INET:
+                conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            print("Connected from", peer if peer else "local")
+            serve(conn, args.nproc, authkey)
+            print("Disconnected")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        if family == socket.AF_UNIX and os.path.exists(addr):
+            os.remove(addr)
@@ -2,7 +2,7 @@
 #  Author: Takuya Kojima
 
 # GenMap classes
-from PEArrayModel import PEArrayModel
+from PEArrayModel import PEArrayModel, DEFAULT_MODEL_CACHE
 from Application import Application
 from SimParameters import SimParameters
 from Placer import Placer
@@ -42,9 +42,22 @@ def parser():
                             help="specify the prefix of frequency unit (default = M)")
     argparser.add_argument("--log", type=str, help="specify log file name (default: no logging)")
     argparser.add_argument("--nproc", type=int, help="specify the number of multi-process (default: cpu count)")
+    argparser.add_argument("--workers", type=str, \
+                            help="specify comma-separated addresses of evaluation workers " + \
+                            "(host:port or unix socket path) instead of local processes")
     argparser.add_argument("--data-flow", type=str, \
                             help="specify the data flow direction", \
                             choices=Placer.DATA_FLOW.keys(), default="any")
+    argparser.add_argument("--checkpoint", type=str, \
+                            help="specify checkpoint file name (default = {output}.ckpt)")
+    argparser.add_argument("--resume", action="store_true", \
+                            help="resume the optimization from the checkpoint file")
+    argparser.add_argument("--model-cache", type=str, \
+                            help="specify cache directory of the architecture model " + \
+                            "(default = {0})".format(DEFAULT_MODEL_CACHE), \
+                            default=DEFAULT_MODEL_CACHE)
+    argparser.add_argument("--no-model-cache", action="store_true", \
+                            help="disable the cache of the architecture model")
     args = argparser.parse_args()
     return args
 
@@ -105,23 +118,16 @@ if __name__ == '__main__':
 
     # load architecture definition
     if os.path.exists(args.arch):
-        # parse XML file
+        # parse XML file and make model instance
+        # (the model is reused from the cache if the file is not changed)
         try:
-            tree_arch = ET.ElementTree(file=args.arch)
+            model = PEArrayModel.load(args.arch, \
+                                      None if args.no_model_cache else args.model_cache)
         except ET.ParseError as e:
             print("Parse Error ({0})".format(args.arch), e.args, file=sys.stderr)
             exit()
-
-        if tree_arch.getroot().tag == "PEArray":
-            # make model instance
-            try:
-                model = PEArrayModel(tree_arch.getroot())
-            except (ValueError, PEArrayModel.InvalidConfigError) as e:
-                print("Invalid definition", e.args)
-                exit()
-        else:
-            print("Parse Error ({0})".format(args.arch), \
-                    "\nRoot tag name must be \"PEArray\"", file=sys.stderr)
+        except (ValueError, PEArrayModel.InvalidConfigError) as e:
+            print("Invalid definition", e.args)
             exit()
     else:
         print("No such file: " + args.arch, file=sys.stderr)
@@ -169,6 +175,12 @@ if __name__ == '__main__':
                 print("output directory:", output_dir, "does not exist")
                 exit()
 
+    # check checkpoint file
+    if args.checkpoint is None:
+        checkpoint_file_name = output_file_name + ".ckpt"
+    else:
+        checkpoint_file_name = args.checkpoint
+
     # confirm overwite
     if os.path.exists(output_file_name):
         inp=input('overwrite ' + output_file_name + ' y/n? >> ')=='y'
@@ -197,12 +209,28 @@ if __name__ == '__main__':
         print("No such file: " + args.opt_conf, file=sys.stderr)
         exit()
 
-    if not args.nproc is None:
-        success_setup = optimizer.setup(model, app, sim_params, args.init_map,\
-                            args.data_flow, proc_num = args.nproc)
+    # check checkpoint files
+    if args.resume:
+        for file_name in optimizer.getCheckpointFiles(checkpoint_file_name):
+            if not os.path.exists(file_name):
+                print("No such checkpoint file: " + file_name, file=sys.stderr)
+                exit()
+
+    if not args.workers is None:
+        workers = [address.strip() for address in args.workers.split(",") if address.strip() != ""]
     else:
-        success_setup = optimizer.setup(model, app, sim_params, args.init_map,\
-                                            args.data_flow)
+        workers = None
+
+    try:
+        if not args.nproc is None:
+            success_setup = optimizer.setup(model, app, sim_params, args.init_map,\
+                                args.data_flow, proc_num = args.nproc, workers = workers)
+        else:
+            success_setup = optimizer.setup(model, app, sim_params, args.init_map,\
+                                                args.data_flow, workers = workers)
+    except (ValueError, ConnectionError) as e:
+        print("Setup failed: ", e.args[0])
+        exit()
 
     # run optimization
     if success_setup:
@@ -221,7 +249,8 @@ if __name__ == '__main__':
         try:
             if tty_off:
                 termios.tcsetattr(fd, termios.TCSANOW, new)
-            hof, fitness_log = optimizer.runOptimization()
+            hof, fitness_log = optimizer.runOptimization(checkpoint=checkpoint_file_name, \
+                                                         resume=args.resume)
             elapsed_time = time.time() - start_time
             time_msg = "elapsed time: {0} [sec]".format(elapsed_time)
             print(time_msg)
@@ -255,6 +284,11 @@ if __name__ == '__main__':
             pickle.dump(save_header, file)
             pickle.dump(save_data, file)
 
+        # the checkpoints are no longer needed
+        for file_name in optimizer.getCheckpointFiles(checkpoint_file_name):
+            if os.path.exists(file_name):
+                os.remove(file_name)
+
     else:
         print("Fail to initilize")
 
@@ -1,7 +1,7 @@
 #  This file is part of GenMap and released under the MIT License, see LICENSE.
 #  Author: Takuya Kojima
 
-from EvalBase import EvalBase
+from EvalBase import EvalBase, COST_CHEAP
 import math
 
 PENALTY_COST = 1000
@@ -53,4 +53,12 @@ class HeterogeneityEval(EvalBase):
 
     @staticmethod
     def name():
-        return "Heterogeneity"
\ No newline at end of file
+        return "Heterogeneity"
+
+    @staticmethod
+    def costClass():
+        return COST_CHEAP
+
+    @staticmethod
+    def mayInvalidate():
+        return True
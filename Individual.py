@@ -3,6 +3,9 @@
 
 import random
 import copy
+import networkx as nx
+
+from OverlayGraph import OverlayGraph
 
 class Individual():
     def __init__(self, CGRA, init_maps = None, preg_num = None):
@@ -33,10 +36,27 @@ class Individual():
         self.__valid = False
         # user data
         self.__userData = {}
+        # compact routing result to restore routed_graph
+        self.__routing = None
+        # routes of the nets inherited from the parents (see getNetRoutes)
+        # they are reused by the routing if still available
+        self.inherited_routes = None
 
     def __eq__(self, other):
         return self.mapping == other.mapping and self.preg == other.preg
 
+    def getGenomeKey(self):
+        """Returns a canonical key of the genome.
+            Individuals having the same mapping and preg configuration
+            have the same key.
+
+            Args: None
+
+            Returns:
+                tuple: hashable genome key
+        """
+        return (tuple(sorted(self.mapping.items())), tuple(self.preg))
+
     def saveEvaluatedData(self, key, data):
         """Save any evaluated data.
 
@@ -63,6 +83,149 @@ class Individual():
     def getAllEvaluatedData(self):
         return copy.deepcopy(self.__userData)
 
+    def exportRouting(self):
+        """Returns a compact encoding of the routing result.
+            Only used nodes and edges of the routed graph are encoded.
+
+            Args: None
+
+            Returns:
+                tuple: (nodes, edges)
+                    nodes: tuple of (node name, attributes)
+                    edges: tuple of (src node name, dst node name, attributes)
+        """
+        if self.routed_graph is None:
+            # not restored yet
+            return self.__routing
+        g = self.routed_graph
+        if isinstance(g, OverlayGraph):
+            # unused nodes and edges are not copied from the base network
+            node_items, edge_items = g.peekNodes(), g.peekEdges()
+        else:
+            node_items, edge_items = g.nodes(data=True), g.edges(data=True)
+        nodes = tuple((v, attr) for v, attr in node_items \
+                        if attr.get("free") == False)
+        edges = tuple((u, v, attr) for u, v, attr in edge_items \
+                        if attr.get("free") == False)
+        return (nodes, edges)
+
+    def getNetRoutes(self):
+        """Returns the routes of the nets among the mapped operations.
+
+            Args: None
+
+            Returns:
+                dict: routes of the nets
+                    keys (tuple): source and destination ALU names
+                    values (list): node names of the path
+        """
+        routing = self.exportRouting()
+        if routing is None:
+            return {}
+        _, edges = routing
+        succ = {}
+        for u, v, _ in edges:
+            succ.setdefault(u, []).append(v)
+
+        alus = set(self.model.getMappedALUs(self.mapping).values())
+        routes = {}
+        for src in alus:
+            # trace the routing tree of the source until the mapped ALUs
+            parent = {src: None}
+            stack = [src]
+            while len(stack) > 0:
+                u = stack.pop()
+                for v in succ.get(u, []):
+                    if v in parent:
+                        continue
+                    parent[v] = u
+                    if v in alus:
+                        path = [v]
+                        while path[-1] != src:
+                            path.append(parent[path[-1]])
+                        routes[(src, v)] = path[::-1]
+                    else:
+                        stack.append(v)
+        return routes
+
+    def __inherit_routes(self, parents):
+        """Sets the routes of the parents as the inherited routes.
+            Only the nets whose source and destination operations
+            are mapped to the same ALUs as the parent are inherited.
+            If both parents have a route of a net, the former one is chosen.
+
+            Args:
+                parents (list): mapping and routes (see getNetRoutes) of each parent
+
+            Returns: None
+        """
+        alu_ops = {alu: op for op, alu in self.model.getMappedALUs(self.mapping).items()}
+        routes = {}
+        for mapping, parent_routes in parents:
+            parent_ops = {alu: op for op, alu in self.model.getMappedALUs(mapping).items()}
+            for (src, dst), path in parent_routes.items():
+                if alu_ops.get(src) == parent_ops[src] and alu_ops.get(dst) == parent_ops[dst]:
+                    routes.setdefault((src, dst), path)
+        self.inherited_routes = routes
+
+    def getEvaluationResult(self):
+        """Returns evaluation result of this individual except for its fitness.
+
+            Args: None
+
+            Returns:
+                tuple: (validity, routing cost, evaluated data, routing)
+                    routing is a compact encoding made by exportRouting
+        """
+        return (self.__valid, self.routing_cost, self.__userData, self.exportRouting())
+
+    def setEvaluationResult(self, result):
+        """Sets evaluation result obtained by getEvaluationResult.
+            The routed graph is not restored until restoreRoutedGraph is called.
+
+            Args:
+                result (tuple): evaluation result
+        """
+        self.__valid, self.routing_cost, user_data, self.__routing = result
+        self.__userData = dict(user_data)
+        self.routed_graph = None
+        # the own routing is inherited by the children instead
+        self.inherited_routes = None
+
+    def restoreRoutedGraph(self):
+        """Restores the routed graph from the compact routing result.
+            For a valid individual, the restored graph is the same as
+            the routed graph after cleaning.
+
+            Args: None
+
+            Returns: None
+        """
+        if self.routed_graph is None and not self.__routing is None:
+            nodes, edges = self.__routing
+            g = nx.DiGraph()
+            g.add_nodes_from((v, dict(attr)) for v, attr in nodes)
+            g.add_edges_from((u, v, dict(attr)) for u, v, attr in edges)
+            self.routed_graph = g
+            self.__routing = None
+
+    def compactCopy(self):
+        """Returns a copy of this individual without the routed graph.
+            The routed graph of the copy can be restored by restoreRoutedGraph.
+
+            Args: None
+
+            Returns:
+                Individual: the copy
+        """
+        ind = copy.copy(self)
+        ind.mapping = copy.copy(self.mapping)
+        ind.preg = copy.copy(self.preg)
+        if hasattr(self, "fitness"):
+            ind.fitness = copy.deepcopy(self.fitness)
+        ind.setEvaluationResult(self.getEvaluationResult())
+        return ind
+
     def mapping_compaction(self):
         """
         Shift the mapping as far as possible
@@ -97,6 +260,8 @@ class Individual():
         # copy from parent
         child1 = copy.deepcopy(father)
         child2 = copy.deepcopy(mother)
+        parents = [(father.mapping, father.getNetRoutes()), \
+                   (mother.mapping, mother.getNetRoutes())]
 
         # initialize each variable
         child1.routed_graph = father.model.getNetwork()
@@ -150,6 +315,10 @@ class Individual():
                 child1.preg[i] = mother.preg[i]
                 child2.preg[i] = father.preg[i]
 
+        # only the nets affected by the crossover will be rerouted
+        child1.__inherit_routes(parents)
+        child2.__inherit_routes(parents[::-1])
+
         return child1, child2
 
     def eliminate_duplication(self):
@@ -208,6 +377,8 @@ class Individual():
             Returns:
                 Individual: mutated individual
         """
+        parent = (copy.copy(ind.mapping), ind.getNetRoutes())
+
         if random.random() <= local_search_prob:
             # Local Search (Swapping)
             swap_op1, swap_op2 = random.sample(list(ind.mapping.keys()), 2)
@@ -242,6 +413,8 @@ class Individual():
         ind.routed_graph = ind.model.getNetwork()
         # reset user data
         ind.__userData = {}
+        # only the nets affected by the mutation will be rerouted
+        ind.__inherit_routes([parent])
 
         return ind,
 
@@ -1,7 +1,7 @@
 #  This file is part of GenMap and released under the MIT License, see LICENSE.
 #  Author: Takuya Kojima
 
-from EvalBase import EvalBase
+from EvalBase import EvalBase, COST_MODERATE
 from DataPathAnalysis import DataPathAnalysis
 
 import statistics
@@ -56,9 +56,9 @@ class LatencyBalanceEval(EvalBase):
         # key:      node name of ALU
         # value:    delay value
         op_attr = nx.get_node_attributes(app.getCompSubGraph(), "opcode")
-        delay_table = {CGRA.getNodeName("ALU", pos): \
+        delay_table = {alu: \
                         sim_params.delay_info[op_attr[op_label]][0] \
-                            for op_label, pos in individual.mapping.items()}
+                            for op_label, alu in CGRA.getMappedALUs(individual.mapping).items()}
 
         for v in individual.routed_graph.nodes():
             if not v in delay_table.keys():
@@ -103,8 +103,7 @@ class LatencyBalanceEval(EvalBase):
     @staticmethod
     def analyze_latency_diff(CGRA, individual, delay_table):
         graph = individual.routed_graph.copy()
-        op_nodes = [CGRA.getNodeName("ALU", pos=pos) \
-                for pos in individual.mapping.values()]
+        op_nodes = list(CGRA.getMappedALUs(individual.mapping).values())
         graph.add_node("root")
         nx.set_node_attributes(graph, 0.0, "min_len")
         nx.set_node_attributes(graph, 0.0, "max_len")
@@ -143,3 +142,11 @@ class LatencyBalanceEval(EvalBase):
     @staticmethod
     def name():
         return "Latency_Balance"
+
+    @staticmethod
+    def costClass():
+        return COST_MODERATE
+
+    @staticmethod
+    def penaltyValue():
+        return PENALTY_COST
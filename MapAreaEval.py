@@ -1,7 +1,7 @@
 #  This file is part of GenMap and released under the MIT License, see LICENSE.
 #  Author: Takuya Kojima
 
-from EvalBase import EvalBase
+from EvalBase import EvalBase, COST_CHEAP
 from MapHeightEval import MapHeightEval
 from MapWidthEval import MapWidthEval
 
@@ -20,4 +20,8 @@ class MapAreaEval(EvalBase):
 
     @staticmethod
     def name():
-        return "Map_Area"
\ No newline at end of file
+        return "Map_Area"
+
+    @staticmethod
+    def costClass():
+        return COST_CHEAP
@@ -1,7 +1,7 @@
 #  This file is part of GenMap and released under the MIT License, see LICENSE.
 #  Author: Takuya Kojima
 
-from EvalBase import EvalBase
+from EvalBase import EvalBase, COST_CHEAP
 import networkx as nx
 import os
 import signal
@@ -27,18 +27,10 @@ class MapHeightEval(EvalBase):
                 int: mapping height
 
         """
-        y_coords = []
-        SEs = [v for v in individual.routed_graph.nodes() if CGRA.isSE(v)]
-        ALUs = [v for v in individual.routed_graph.nodes() if CGRA.isALU(v)]
+        # coordinates of the used ALUs and SEs
+        y_coords = [CGRA.getNodeCoord(v)[1] for v in individual.routed_graph.nodes() \
+                    if CGRA.isSE(v) or CGRA.isALU(v)]
         width, height = CGRA.getSize()
-        for node in SEs + ALUs:
-            for x in range(width):
-                for y in range(height):
-                    rsc = CGRA.get_PE_resources((x, y))
-                    if node in  [v for se_set in rsc["SE"].values() for v in se_set ] or \
-                        node == rsc["ALU"]:
-                        y_coords.append(y)
-                        break
         map_height = max(y_coords) + 1
 
         if "quit_minheight" in info.keys():
@@ -66,4 +58,8 @@ class MapHeightEval(EvalBase):
 
     @staticmethod
     def name():
-        return "Mapping_Height"
\ No newline at end of file
+        return "Mapping_Height"
+
+    @staticmethod
+    def costClass():
+        return COST_CHEAP
@@ -1,7 +1,7 @@
 #  This file is part of GenMap and released under the MIT License, see LICENSE.
 #  Author: Takuya Kojima
 
-from EvalBase import EvalBase
+from EvalBase import EvalBase, COST_CHEAP
 import networkx as nx
 import os
 import signal
@@ -30,18 +30,10 @@ class MapWidthEval(EvalBase):
                 map_width: mapping width
 
         """
-        x_coords = []
-        SEs = [v for v in individual.routed_graph.nodes() if CGRA.isSE(v)]
-        ALUs = [v for v in individual.routed_graph.nodes() if CGRA.isALU(v)]
+        # coordinates of the used ALUs and SEs
+        x_coords = [CGRA.getNodeCoord(v)[0] for v in individual.routed_graph.nodes() \
+                    if CGRA.isSE(v) or CGRA.isALU(v)]
         width, height = CGRA.getSize()
-        for node in SEs + ALUs:
-            for x in range(width):
-                for y in range(height):
-                    rsc = CGRA.get_PE_resources((x, y))
-                    if node in  [v for se_set in rsc["SE"].values() for v in se_set ] or \
-                        node == rsc["ALU"]:
-                        x_coords.append(x)
-                        break
         map_width = max(x_coords) + 1
         individual.saveEvaluatedData("map_width", map_width)
 
@@ -62,4 +54,8 @@ class MapWidthEval(EvalBase):
 
     @staticmethod
     def name():
-        return "Mapping_Width"
\ No newline at end of file
+        return "Mapping_Width"
+
+    @staticmethod
+    def costClass():
+        return COST_CHEAP
@@ -9,15 +9,25 @@ from deap import creator
 import multiprocessing
 import numpy
 import copy
+import math
+from collections import OrderedDict
 from time import time
 from tqdm import tqdm
 from importlib import import_module
 import signal
+import random
+import pickle
+import os
+import queue
 
 from Individual import Individual
 from EvalBase import EvalBase
+from EvalScheduler import EvalScheduler
 from RouterBase import RouterBase
 from Placer import Placer
+from FastNDSort import selNSGA2
+from ParetoArchive import ParetoArchive
+from RemoteEvaluator import RemoteEvaluator
 from WireLengthEval import WireLengthEval
 
 DEFAULT_PARAMS = {
@@ -34,9 +44,67 @@ DEFAULT_PARAMS = {
     "Initial place iteration":      100,
     "Initial place count":          200,
     "Random place count":           100,
-    "Topological sort probability": 0.5
+    "Topological sort probability": 0.5,
+    "Fitness cache size":           10000,
+    "Checkpoint interval":          10,
+    "Island count":                 1,
+    "Migration interval":           10,
+    "Migration size":               5,
+    "Archive epsilon":              0
 }
 
+# available evolution modes
+#   generational: offspring are evaluated together for each generation
+#   steady-state: each offspring is evaluated asynchronously and
+#                 inserted into the population as soon as it is evaluated
+EVOLUTION_MODES = ["generational", "steady-state"]
+
+# available migration topologies among islands
+#   ring: each island sends migrants to the next island
+#   full: each island sends migrants to all the other islands
+#   random: each island sends migrants to a randomly chosen island
+MIGRATION_TOPOLOGIES = ["ring", "full", "random"]
+
+# desired processing time of a task chunk sent to the pool [sec]
+TARGET_CHUNK_TIME = 0.05
+
+# evaluation context of worker processes
+#   it is received only once for each worker by the pool initializer
+_worker_context = None
+
+def _init_worker(context):
+    """Initializes an evaluation worker process.
+
+        Args:
+            context (dict): evaluation context
+                keys are the argument names of NSGA2.eval_objectives
+    """
+    global _worker_context
+    _worker_context = context
+
+def _eval_genome(genome):
+    """Evaluates a genome in a worker process.
+
+        Args:
+            genome (tuple): mapping, preg configuration and
+                            inherited routes of an individual
+
+        Returns:
+            tuple: (fitness list, evaluation result)
+                evaluation result is a compact one given by
+                Individual.getEvaluationResult
+    """
+    ctx = _worker_context
+    mapping, preg, routes = genome
+    individual = Individual(ctx["CGRA"])
+    individual.mapping = mapping
+    individual.preg = preg
+    individual.inherited_routes = routes
+    fitness, individual = NSGA2.eval_objectives(ctx["scheduler"], ctx["CGRA"], ctx["app"], \
+                                                ctx["sim_params"], ctx["router"], \
+                                                ctx["router_opts"], ctx["rt_ops"], individual)
+    return fitness, individual.getEvaluationResult()
+
 class NSGA2():
     def __init__(self, config, logfile = None):
         """Constructor of the NSGA2 class.
@@ -74,10 +142,10 @@ class NSGA2():
                 raise ValueError("missing parameter name")
 
         # get router
-        try:
-            router_name = config.find("Router").text
-        except AttributeError:
+        router_ele = config.find("Router")
+        if router_ele is None:
             raise ValueError("missing Router class")
+        router_name = router_ele.text
         if router_name is None:
             raise ValueError("Router class name is empty")
         try:
@@ -86,6 +154,28 @@ class NSGA2():
             raise ValueError("Import Error for Router: " + router_name)
         if not issubclass(self.__router, RouterBase):
             raise TypeError(self.__router.__name__ + " is not RouterBase class")
+        # router options are given as attributes
+        self.__router_options = self.__router.parse_options(dict(router_ele.attrib))
+
+        # get evolution mode
+        mode_ele = config.find("Mode")
+        if mode_ele is None:
+            self.__mode = EVOLUTION_MODES[0]
+        elif mode_ele.text is None or not mode_ele.text.strip() in EVOLUTION_MODES:
+            raise ValueError("Unknown evolution mode: " + str(mode_ele.text) + \
+                             " (available modes: " + ", ".join(EVOLUTION_MODES) + ")")
+        else:
+            self.__mode = mode_ele.text.strip()
+
+        # get migration topology for island model
+        topology_ele = config.find("MigrationTopology")
+        if topology_ele is None:
+            self.__topology = MIGRATION_TOPOLOGIES[0]
+        elif topology_ele.text is None or not topology_ele.text.strip() in MIGRATION_TOPOLOGIES:
+            raise ValueError("Unknown migration topology: " + str(topology_ele.text) + \
+                             " (available topologies: " + ", ".join(MIGRATION_TOPOLOGIES) + ")")
+        else:
+            self.__topology = topology_ele.text.strip()
 
         # init routing options
         self.__const_route_en = False
@@ -151,8 +241,33 @@ class NSGA2():
                 else:
                     raise ValueError("Arguments of evaluation function must be dict: " + str(args_obj))
 
+        # decide evaluation order of the objectives
+        self.__scheduler = EvalScheduler(self.__eval_list, self.__eval_args)
+
         self.pop = []
         self.__placer = None
+        self.__pool = None
+        self.__proc_num = 1
+        self.__worker_context = None
+        # addresses of remote evaluation workers
+        self.__workers = None
+        # island information (only for island processes)
+        #   keys: index, inboxes, status
+        self.__island = None
+        # estimated evaluation time per individual (used for chunk sizing)
+        self.__task_time = None
+
+        # fitness cache
+        #   key: genome key of an individual
+        #   value: tuple of (fitness, evaluation result)
+        #   the least recently used one is evicted first
+        self.__fitness_cache = OrderedDict()
+        self.__cache_hit = 0
+        self.__cache_miss = 0
+        # routing statistics summed up for a generation
+        #   key: name of the statistics
+        #   value: count
+        self.__routing_stats = {}
         self.__random_pop_args = []
 
         # regist log gile
@@ -172,7 +287,7 @@ class NSGA2():
         return {"pool": self}
 
 
-    def setup(self, CGRA, app, sim_params, method, dir, proc_num = 1):
+    def setup(self, CGRA, app, sim_params, method, dir, proc_num = 1, workers = None):
         """Setup NSGA2 optimization
 
             Args:
@@ -189,12 +304,24 @@ class NSGA2():
                 Option:
                     proc_num (int): the number of process
                                     Default is 1
+                    workers (list of str): addresses of evaluation workers (EvalWorker.py)
+                                           If it is specified, individuals are evaluated
+                                           by the workers instead of local processes.
+                                           Default is None
 
             Returns:
                 bool: if the setup successes, return True, otherwise return False.
 
+            Raise:
+                ValueError: if the workers are fewer than the islands
+                ConnectionError: if it fails to connect a worker
+
         """
 
+        if not workers is None and len(workers) < self.__params["Island count"]:
+            raise ValueError("At least one evaluation worker is needed for each island")
+        self.__workers = workers
+
         # initilize weights of network model
         self.__router.set_default_weights(CGRA)
 
@@ -253,17 +380,24 @@ class NSGA2():
         creator.create("Individual", Individual, fitness=creator.Fitness)
 
         # setting multiprocessing
-        self.__pool = multiprocessing.Pool(proc_num)
-        self.__toolbox.register("map", self.__pool.map)
+        #   each worker receives the evaluation context only once at its startup
+        #   so that each task carries only a genome
+        worker_context = {"scheduler": self.__scheduler, \
+                          "CGRA": CGRA, "app": app, "sim_params": sim_params, \
+                          "router": self.__router, "router_opts": self.__router_options, \
+                          "rt_ops": rt_options}
+        self.__worker_context = worker_context
+        self.__proc_num = proc_num
+        if self.__params["Island count"] <= 1:
+            self.__start_pool(proc_num, workers)
+        # otherwise, each island process starts its own pool
 
         # register each chromosome operation
-        if self.__pipeline_enable > 0:
-            self.__toolbox.register("individual", creator.Individual, CGRA, init_maps, self.__preg_num)
-        else:
-            self.__toolbox.register("individual", creator.Individual, CGRA, init_maps)
+        self.__register_individual(CGRA, init_maps)
         self.__toolbox.register("population", tools.initRepeat, list, self.__toolbox.individual)
         self.__toolbox.register("random_individual", creator.Individual, CGRA)
-        self.__toolbox.register("evaluate", self.eval_objectives, self.__eval_list, self.__eval_args, CGRA, app, sim_params, self.__router, rt_options)
+        self.__toolbox.register("empty_individual", creator.Individual, CGRA)
+        self.__toolbox.register("evaluate", _eval_genome)
         self.__toolbox.register("mate", Individual.cxSet)
         # determine the local serach probability for mutation
         if len(app.getCompSubGraph().nodes()) == (width * height):
@@ -273,7 +407,7 @@ class NSGA2():
         else:
             ls_prob = 0.5
         self.__toolbox.register("mutate", Individual.mutSet, ls_prob)
-        self.__toolbox.register("select", tools.selNSGA2)
+        self.__toolbox.register("select", selNSGA2)
 
         # set statics method
         self.stats = tools.Statistics(key=lambda ind: ind.fitness.values)
@@ -293,6 +427,42 @@ class NSGA2():
 
         return True
 
+    def __start_pool(self, proc_num, workers = None):
+        """ Starts the worker pool for evaluation.
+
+            Args:
+                proc_num (int): the number of process
+                Option:
+                    workers (list of str): addresses of remote evaluation workers
+                                           If it is specified, they are used instead
+                                           of local processes.
+
+            Returns: None
+        """
+        if workers is None:
+            self.__pool = multiprocessing.Pool(proc_num, initializer=_init_worker, \
+                                               initargs=(self.__worker_context, ))
+            self.__proc_num = proc_num
+        else:
+            self.__pool = RemoteEvaluator(workers, initializer=_init_worker, \
+                                          initargs=(self.__worker_context, ))
+            self.__proc_num = self.__pool.capacity()
+        self.__toolbox.register("map", self.__pool.map)
+
+    def __register_individual(self, CGRA, init_maps):
+        """ Registers individual generator with initial mappings.
+
+            Args:
+                CGRA (PEArrayModel): A model of the CGRA
+                init_maps (list): initial mappings
+
+            Returns: None
+        """
+        if self.__pipeline_enable > 0:
+            self.__toolbox.register("individual", creator.Individual, CGRA, init_maps, self.__preg_num)
+        else:
+            self.__toolbox.register("individual", creator.Individual, CGRA, init_maps)
+
     def random_population(self, n):
         """ Generate rondom mapping as a population.
 
@@ -306,16 +476,184 @@ class NSGA2():
         random_mappings = self.__placer.make_random_mappings(*self.__random_pop_args)
         return [self.__toolbox.random_individual(random_mappings, self.__preg_num) for i in range(n)]
 
-    def eval_objectives(self, eval_list, eval_args, CGRA, app, sim_params, router, rt_ops, individual):
+    def __chunksize(self, task_count):
+        """ Decides chunk size of tasks for the pool.
+
+            Args:
+                task_count (int): the number of tasks
+
+            Returns:
+                int: chunk size
+        """
+        # upper limit is the same as the default of multiprocessing.Pool.map
+        max_size = max(1, math.ceil(task_count / (self.__proc_num * 4)))
+        if self.__task_time is None or self.__task_time <= 0:
+            return max_size
+        # small chunks for heavy tasks to balance the loads among the workers
+        return max(1, min(max_size, int(TARGET_CHUNK_TIME / self.__task_time)))
+
+    def __evaluate(self, individuals):
+        """ Evaluates individuals with the worker pool.
+            Individuals whose genome has been already evaluated are
+            not sent to the pool and the cached results are used.
+            Individuals having inherited routes bypass the fitness cache
+            because their routing depends on the parents.
+
+            Args:
+                individuals (list): individuals to be evaluated
+
+            Returns:
+                list: evaluated individuals
+
+            Notes:
+                The individuals are updated in place.
+                Their routed graphs are not restored until restoreRoutedGraph
+                is called.
+        """
+        # look up the fitness cache
+        #   key: genome key
+        #   value: individuals to be evaluated having the genome
+        pending = OrderedDict()
+        # individuals evaluated with inherited routes
+        uncached = []
+        for ind in individuals:
+            if not self.__is_cacheable(ind):
+                uncached.append(ind)
+                continue
+            key = ind.getGenomeKey()
+            if key in pending:
+                # duplicated genome in the individuals
+                pending[key].append(ind)
+                self.__cache_hit += 1
+                continue
+            cached = self.__lookup_cache(key)
+            if cached is None:
+                pending[key] = [ind]
+            else:
+                fit, result = cached
+                ind.fitness.values = fit
+                ind.setEvaluationResult(result)
+
+        if len(pending) == 0 and len(uncached) == 0:
+            return individuals
+
+        genomes = [(inds[0].mapping, inds[0].preg, inds[0].inherited_routes) \
+                    for inds in pending.values()] + \
+                  [(ind.mapping, ind.preg, ind.inherited_routes) \
+                    for ind in uncached]
+        start = time()
+        results = self.__toolbox.map(self.__toolbox.evaluate, genomes, \
+                                     chunksize=self.__chunksize(len(genomes)))
+        # update estimated evaluation time per individual
+        task_time = (time() - start) * self.__proc_num / len(genomes)
+        if self.__task_time is None:
+            self.__task_time = task_time
+        else:
+            self.__task_time = (self.__task_time + task_time) / 2
+
+        results = list(results)
+        for (key, inds), (fit, result) in zip(pending.items(), results):
+            for ind in inds:
+                ind.fitness.values = fit
+                ind.setEvaluationResult(result)
+            self.__store_cache(key, fit, result)
+            self.__count_routing_stats(result)
+
+        for ind, (fit, result) in zip(uncached, results[len(pending):]):
+            ind.fitness.values = fit
+            ind.setEvaluationResult(result)
+            self.__count_routing_stats(result)
+
+        return individuals
+
+    @staticmethod
+    def __is_cacheable(ind):
+        """ Checks if the evaluation result of an individual can be cached.
+            An individual having inherited routes can get a different result
+            from another one having the same genome, so it is not cached.
+
+            Args:
+                ind (Individual): an individual to be evaluated
+
+            Returns:
+                bool: True if the result depends only on the genome
+        """
+        return not ind.inherited_routes
+
+    def __lookup_cache(self, key):
+        """ Looks up the fitness cache.
+
+            Args:
+                key (tuple): genome key of an individual
+
+            Returns:
+                tuple: (fitness, evaluation result) if cached, otherwise None
+        """
+        if key in self.__fitness_cache:
+            self.__fitness_cache.move_to_end(key)
+            self.__cache_hit += 1
+            return self.__fitness_cache[key]
+        else:
+            self.__cache_miss += 1
+            return None
+
+    def __store_cache(self, key, fit, result):
+        """ Stores an evaluated result to the fitness cache.
+
+            Args:
+                key (tuple): genome key of an individual
+                fit (list): fitness
+                result (tuple): evaluation result
+
+            Returns: None
+        """
+        cache_size = self.__params["Fitness cache size"]
+        if cache_size > 0:
+            self.__fitness_cache[key] = (fit, result)
+        # evict least recently used entries
+        while len(self.__fitness_cache) > cache_size:
+            self.__fitness_cache.popitem(last = False)
+
+    def __count_routing_stats(self, result):
+        """ Adds routing statistics of an evaluated result to those of the generation.
+
+            Args:
+                result (tuple): evaluation result
+
+            Returns: None
+        """
+        _, _, user_data, _ = result
+        for name, count in user_data.get("routing_stats", {}).items():
+            self.__routing_stats[name] = self.__routing_stats.get(name, 0) + count
+
+    def __format_routing_stats(self):
+        """ Returns a log line of the routing statistics of the generation.
+        """
+        items = ["{0} = {1}".format(name, count) for name, count in self.__routing_stats.items()]
+        for name, hit in self.__routing_stats.items():
+            if name.endswith("_hit"):
+                miss = self.__routing_stats.get(name[:-len("_hit")] + "_miss", 0)
+                if hit + miss > 0:
+                    items.append("{0} rate = {1:.3f}".format(name, hit / (hit + miss)))
+        return "\trouting stats: {0}\n".format(", ".join(items))
+
+    @staticmethod
+    def eval_objectives(scheduler, CGRA, app, sim_params, router, router_opts, rt_ops, individual):
         """ Executes evaluation for each objective
         """
         # routing the mapping
-        self.__doRouting(CGRA, app, router, rt_ops, individual)
-        # evaluate each objectives
-        return [eval_cls.eval(CGRA, app, sim_params, individual, **args) \
-                for eval_cls, args in zip(eval_list, eval_args)], individual
-
-    def __doRouting(self, CGRA, app, router, rt_ops, individual):
+        NSGA2.__doRouting(CGRA, app, router, router_opts, rt_ops, individual)
+        individual.saveEvaluatedData("routing_stats", \
+                                     router.get_routing_stats(individual.routed_graph))
+        if not individual.isValid():
+            # the routing failure making the individual invalid
+            individual.saveEvaluatedData("routing_failure", \
+                                         router.get_routing_failure(individual.routed_graph))
+        # evaluate each objectives in the order decided by the scheduler
+        return scheduler.evaluate(CGRA, app, sim_params, individual), individual
+
+    @staticmethod
+    def __doRouting(CGRA, app, router, router_opts, rt_ops, individual):
         """
             Execute routing
         """
@@ -334,26 +672,32 @@ class NSGA2():
         const_rt_en, input_rt_en, output_rt_en, inout_rt_en = rt_ops
 
         # comp routing
-        cost += router.comp_routing(CGRA, app.getCompSubGraph(), individual.mapping, g)
+        # each stage can stop routing once the total cost exceeds the penalty
+        # the nets not affected by the variation can reuse the routes of the parents
+        cost += router.comp_routing(CGRA, app.getCompSubGraph(), individual.mapping, g, \
+                                    budget = penalty - cost, \
+                                    inherited_routes = individual.inherited_routes, **router_opts)
         if cost > penalty:
             individual.routing_cost = cost + penalty * 40
             return
 
         # const routing
         if const_rt_en:
-            cost += router.const_routing(CGRA, app.getConstSubGraph(), individual.mapping, g)
+            cost += router.const_routing(CGRA, app.getConstSubGraph(), individual.mapping, g, \
+                                         budget = penalty - cost, **router_opts)
             if cost > penalty:
                 individual.routing_cost = cost + penalty * 30
                 return
 
         if inout_rt_en:
             cost += router.inout_routing(CGRA, app.getInputSubGraph(), \
-                app.getOutputSubGraph(), individual.mapping, g)
+                app.getOutputSubGraph(), individual.mapping, g, budget = penalty - cost, **router_opts)
 
         else:
             # input routing
             if input_rt_en:
-                cost += router.input_routing(CGRA, app.getInputSubGraph(), individual.mapping, g)
+                cost += router.input_routing(CGRA, app.getInputSubGraph(), individual.mapping, g, \
+                                             budget = penalty - cost, **router_opts)
                 if cost > penalty:
                     individual.routing_cost = cost + penalty * 20
                     return
@@ -362,9 +706,11 @@ class NSGA2():
             if output_rt_en:
                 if CGRA.getPregNumber() > 0:
                     cost += router.output_routing(CGRA, app.getOutputSubGraph(), \
-                                                    individual.mapping, g, individual.preg)
+                                                    individual.mapping, g, preg_conf = individual.preg, \
+                                                    budget = penalty - cost, **router_opts)
                 else:
-                    cost += router.output_routing(CGRA, app.getOutputSubGraph(), individual.mapping, g)
+                    cost += router.output_routing(CGRA, app.getOutputSubGraph(), individual.mapping, g, \
+                                                  budget = penalty - cost, **router_opts)
 
 
         if cost > penalty:
@@ -377,32 +723,88 @@ class NSGA2():
             individual.validate()
 
 
-    def runOptimization(self):
-        # hall of fame
-        hof = tools.ParetoFront()
+    def __save_checkpoint(self, path, gen_count, stall_count, hof, fitness_hof_log):
+        """ Saves optimization state to a checkpoint file.
+            The file is replaced atomically so that a checkpoint is
+            never broken even if the process is killed while saving.
+
+            Args:
+                path (str): checkpoint file name
+                gen_count (int): generation count
+                stall_count (int): stall count
+                hof (ParetoArchive): hall of fame
+                fitness_hof_log (list): fitness log of the hall of fame
 
-        self.progress.set_description("Initilizing")
-        # generate first population
-        self.pop = self.__toolbox.population(n=self.__params["Initial population size"])
+            Returns: None
+        """
+        state = {"gen_count": gen_count, "stall_count": stall_count,
+                 "pop": [self.__dump_individual(ind) for ind in self.pop],
+                 "hof": [self.__dump_individual(ind) for ind in hof],
+                 "fitness_hof_log": fitness_hof_log,
+                 "random_state": random.getstate(),
+                 "numpy_random_state": numpy.random.get_state()}
+
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def __load_checkpoint(self, path, hof):
+        """ Loads optimization state from a checkpoint file.
 
-        # evaluate the population
-        fitnesses, self.pop = (list(l) for l in zip(*self.__toolbox.map(self.__toolbox.evaluate, self.pop)))
-        for ind, fit in zip(self.pop, fitnesses):
-            ind.fitness.values = fit
+            Args:
+                path (str): checkpoint file name
+                hof (ParetoArchive): hall of fame to be restored
 
-        # start evolution
-        gen_count = 0
-        stall_count = 0
-        prev_hof = []
-        fitness_hof_log = []
+            Returns:
+                tuple: (generation count, stall count, fitness log of the hall of fame)
+        """
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+
+        self.pop = [self.__load_individual(record) for record in state["pop"]]
+        hof.update([self.__load_individual(record) for record in state["hof"]])
+
+        random.setstate(state["random_state"])
+        numpy.random.set_state(state["numpy_random_state"])
+
+        return state["gen_count"], state["stall_count"], state["fitness_hof_log"]
+
+    @staticmethod
+    def __dump_individual(ind):
+        return ((ind.mapping, ind.preg), ind.fitness.values, ind.getEvaluationResult())
+
+    def __load_individual(self, record):
+        (mapping, preg), fit, result = record
+        ind = self.__toolbox.empty_individual()
+        ind.mapping = mapping
+        ind.preg = preg
+        ind.fitness.values = fit
+        ind.setEvaluationResult(result)
+        return ind
+
+    def __generational_evolution(self, hof, gen_count, stall_count, fitness_hof_log, checkpoint):
+        """ Repeats evolution generation by generation.
+
+            Args:
+                hof (ParetoArchive): hall of fame
+                gen_count (int): generation count at the beginning
+                stall_count (int): stall count at the beginning
+                fitness_hof_log (list): fitness log of the hall of fame
+                checkpoint (str): checkpoint file name
+
+            Returns:
+                int: generation count at the end
+        """
+        prev_signature = hof.signature()
 
         # Repeat evolution
         while gen_count < self.__params["Maximum generation"] and stall_count < self.__params["Maximum stall"]:
             # show generation count
             gen_count = gen_count + 1
-            self.progress.set_description("Generation {0}".format(gen_count))
-            if not self.__logfile is None:
-                self.__logfile.write("Generation {0}\n".format(gen_count))
+            self.__begin_generation(gen_count)
 
             # make offspring
             offspring = algorithms.varOr(self.pop, self.__toolbox, self.__params["Offspring size"], \
@@ -410,68 +812,487 @@ class NSGA2():
                                          self.__params["Mutation probability"])
 
             # Evaluate the individuals of the offspring
-            fitnesses, offspring = (list(l) for l in zip(*self.__toolbox.map(self.__toolbox.evaluate, offspring)))
-            for ind, fit in zip(offspring, fitnesses):
-                ind.fitness.values = fit
+            offspring = self.__evaluate(offspring)
 
             # make next population
             self.pop = self.__toolbox.select(self.pop + offspring , self.__params["Select size"])
             hof.update(self.pop)
 
-            # check if there is an improvement
-            if len(hof) == len(prev_hof):
-                if set([ind.fitness.values for ind in hof]) == \
-                    set([ind.fitness.values for ind in prev_hof]):
-                    # no fitness improvement
-                    stall_count += 1
+            # Adding random individuals to the population (attempt to avoid local optimum)
+            rnd_ind = self.random_population(self.__params["Random population size"])
+            self.pop += self.__evaluate(rnd_ind)
+
+            stall_count, prev_signature, stop = self.__end_generation(gen_count, stall_count, hof, \
+                                                                prev_signature, fitness_hof_log, \
+                                                                checkpoint)
+            if stop:
+                break
+
+        return gen_count
+
+    def __steady_state_evolution(self, hof, gen_count, stall_count, fitness_hof_log, checkpoint):
+        """ Repeats evolution in steady-state manner.
+            Each offspring is evaluated asynchronously so that all the workers
+            are kept busy, and it is inserted into the population as soon as
+            its evaluation finishes.
+            Evaluations of "Offspring size" individuals are regarded as a generation.
+
+            Args:
+                hof (ParetoArchive): hall of fame
+                gen_count (int): generation count at the beginning
+                stall_count (int): stall count at the beginning
+                fitness_hof_log (list): fitness log of the hall of fame
+                checkpoint (str): checkpoint file name
+
+            Returns:
+                int: generation count at the end
+        """
+        prev_signature = hof.signature()
+
+        # evaluated individuals
+        #   each item is a tuple of
+        #   (individual, genome key, evaluated flag, (fitness, evaluation result))
+        #   or an exception raised in a worker
+        #   The genome key is None if the result is not stored to the fitness cache.
+        #   The flag is True if the individual is evaluated by a worker.
+        #   The fitness cache and the statistics are updated only in this thread.
+        arrivals = queue.Queue()
+        in_flight = 0
+        max_in_flight = self.__proc_num * 2
+        immigrants = []
+        eval_count = 0
+
+        stop = gen_count >= self.__params["Maximum generation"] or \
+                stall_count >= self.__params["Maximum stall"]
+        if not stop:
+            self.__begin_generation(gen_count + 1)
+
+        while not stop or in_flight > 0:
+            # keep all the workers busy
+            while not stop and in_flight < max_in_flight:
+                if len(immigrants) > 0:
+                    ind = immigrants.pop()
                 else:
-                    stall_count = 0
-            else:
-                stall_count = 0
+                    ind = algorithms.varOr(self.pop, self.__toolbox, 1, \
+                                           self.__params["Crossover probability"],\
+                                           self.__params["Mutation probability"])[0]
+                self.__submit(ind, arrivals)
+                in_flight += 1
+
+            item = arrivals.get()
+            in_flight -= 1
+            if isinstance(item, Exception):
+                raise item
+            ind, key, evaluated, (fit, result) = item
+            if not key is None:
+                self.__store_cache(key, fit, result)
+            if evaluated:
+                self.__count_routing_stats(result)
+            if stop:
+                # discard the remaining evaluations
+                continue
 
-            prev_hof = copy.deepcopy(hof)
+            ind.fitness.values = fit
+            ind.setEvaluationResult(result)
+
+            # select incrementally
+            self.pop = self.__toolbox.select(self.pop + [ind], self.__params["Select size"])
+            hof.update([ind])
+
+            eval_count += 1
+            if eval_count == self.__params["Offspring size"]:
+                eval_count = 0
+                gen_count += 1
+                # random individuals are also evaluated in the next generation
+                immigrants = self.random_population(self.__params["Random population size"])
+                stall_count, prev_signature, stop = self.__end_generation(gen_count, stall_count, hof, \
+                                                                    prev_signature, fitness_hof_log, \
+                                                                    checkpoint)
+                stop |= gen_count >= self.__params["Maximum generation"] or \
+                        stall_count >= self.__params["Maximum stall"]
+                if not stop:
+                    self.__begin_generation(gen_count + 1)
+
+        return gen_count
+
+    def __submit(self, ind, arrivals):
+        """ Submits an individual to the pool asynchronously.
 
-            # logging hof fitness (only valid individuals)
-            fitness_hof_log.append([ind.fitness.values for ind in hof if ind.isValid()])
+            Args:
+                ind (Individual): an individual to be evaluated
+                arrivals (queue.Queue): queue to receive the evaluated individual
 
-            # Adding random individuals to the population (attempt to avoid local optimum)
-            rnd_ind = self.random_population(self.__params["Random population size"])
-            fitnesses, rnd_ind = (list(l) for l in zip(*self.__toolbox.map(self.__toolbox.evaluate, rnd_ind)))
-            for ind, fit in zip(rnd_ind, fitnesses):
-                ind.fitness.values = fit
-            self.pop += rnd_ind
+            Returns: None
+        """
+        if self.__is_cacheable(ind):
+            key = ind.getGenomeKey()
+            cached = self.__lookup_cache(key)
+            if not cached is None:
+                arrivals.put((ind, None, False, cached))
+                return
+        else:
+            key = None
 
-            # update status
-            self.progress.set_postfix(hof_len=len(hof), stall=stall_count)
-            self.progress.update(1)
-            stats = self.stats.compile(hof)
-            for i in range(len(stats["min"])):
-                self.status_disp[i].set_postfix(min=stats["min"][i], max=stats["max"][i])
+        # it runs on the result handler thread of the pool
+        def callback(res):
+            arrivals.put((ind, key, True, res))
 
-            # logging
-            if not self.__logfile is None:
-                self.__logfile.write("\thof_len = {0} stall = {1}\n".format(len(hof), stall_count))
-                for i in range(len(stats["min"])):
-                    self.__logfile.write("\t{obj}: min = {min}, max = {max}\n".format(\
-                                            obj = self.status_disp[i].desc, min = stats["min"][i],\
-                                            max=stats["max"][i]))
-
-            # check termination condition is met or not
-            termination = False
+        self.__pool.apply_async(self.__toolbox.evaluate, \
+                                ((ind.mapping, ind.preg, ind.inherited_routes), ), \
+                                callback=callback, error_callback=arrivals.put)
+
+    def __begin_generation(self, gen_count):
+        """ Shows the generation count and resets the statistics.
+        """
+        self.progress.set_description("Generation {0}".format(gen_count))
+        if not self.__logfile is None:
+            self.__logfile.write("Generation {0}\n".format(gen_count))
+
+        # reset cache statistics
+        self.__cache_hit = 0
+        self.__cache_miss = 0
+        self.__routing_stats = {}
+
+    def __end_generation(self, gen_count, stall_count, hof, prev_signature, fitness_hof_log, checkpoint):
+        """ Updates stall count, logs and status at the end of a generation.
+
+            Args:
+                gen_count (int): generation count
+                stall_count (int): stall count
+                hof (ParetoArchive): hall of fame
+                prev_signature (tuple): signature of the hall of fame at the previous generation
+                fitness_hof_log (list): fitness log of the hall of fame
+                checkpoint (str): checkpoint file name
+
+            Returns:
+                tuple: (updated stall count, signature of the hall of fame,
+                        whether the evolution should be stopped or not)
+        """
+        # check if there is an improvement
+        signature = hof.signature()
+        if signature == prev_signature:
+            # no fitness improvement
+            stall_count += 1
+        else:
+            stall_count = 0
+
+        # logging hof fitness (only valid individuals)
+        fitness_hof_log.append([ind.fitness.values for ind in hof if ind.isValid()])
+
+        # exchange individuals with the other islands
+        if not self.__island is None:
+            self.__island["status"].put(("progress", self.__island["index"], \
+                                         gen_count, len(hof), stall_count))
+            interval = self.__params["Migration interval"]
+            if interval > 0 and gen_count % interval == 0:
+                self.__migrate()
+
+        # save checkpoint
+        interval = self.__params["Checkpoint interval"]
+        if not checkpoint is None and interval > 0 and gen_count % interval == 0:
+            self.__save_checkpoint(checkpoint, gen_count, stall_count, hof, fitness_hof_log)
+
+        # update status
+        self.progress.set_postfix(hof_len=len(hof), stall=stall_count, \
+                                  cache_hit=self.__cache_hit, cache_miss=self.__cache_miss)
+        self.progress.update(1)
+        stats = self.stats.compile(hof)
+        for i in range(len(stats["min"])):
+            self.status_disp[i].set_postfix(min=stats["min"][i], max=stats["max"][i])
+
+        # logging
+        if not self.__logfile is None:
+            self.__logfile.write("\thof_len = {0} stall = {1}\n".format(len(hof), stall_count))
+            self.__logfile.write("\tcache hit = {0} miss = {1}\n".format(\
+                                    self.__cache_hit, self.__cache_miss))
+            if len(self.__routing_stats) > 0:
+                self.__logfile.write(self.__format_routing_stats())
             for i in range(len(stats["min"])):
-                if self.__fitness_threshold_checker[i]((stats["min"][i], stats["max"][i])):
-                    termination = True
-                    break
-            if termination and \
-                gen_count >= self.__params["Minimum generation"]:
+                self.__logfile.write("\t{obj}: min = {min}, max = {max}\n".format(\
+                                        obj = self.status_disp[i].desc, min = stats["min"][i],\
+                                        max=stats["max"][i]))
+
+        # check termination condition is met or not
+        termination = False
+        for i in range(len(stats["min"])):
+            if self.__fitness_threshold_checker[i]((stats["min"][i], stats["max"][i])):
+                termination = True
                 break
-                
+        stop = termination and gen_count >= self.__params["Minimum generation"]
+
+        return stall_count, signature, stop or self.__quit
+
+    def __migrate(self):
+        """ Sends the best individuals to the neighbor islands
+            and receives immigrants from the other islands.
+            Immigrants are received without waiting for them.
+
+            Returns: None
+        """
+        idx = self.__island["index"]
+        inboxes = self.__island["inboxes"]
+        others = [i for i in range(len(inboxes)) if i != idx]
+        if self.__topology == "ring":
+            dests = [(idx + 1) % len(inboxes)]
+        elif self.__topology == "full":
+            dests = others
+        else:
+            dests = [random.choice(others)]
+
+        size = min(self.__params["Migration size"], len(self.pop))
+        migrants = [self.__dump_individual(ind) for ind in self.__toolbox.select(self.pop, size)]
+        for dest in dests:
+            inboxes[dest].put(migrants)
+
+        while True:
+            try:
+                records = inboxes[idx].get_nowait()
+            except queue.Empty:
+                break
+            self.pop += [self.__load_individual(record) for record in records]
+
+    def getCheckpointFiles(self, checkpoint):
+        """ Returns checkpoint file names actually used.
+            In island model, each island saves its own checkpoint.
+
+            Args:
+                checkpoint (str): checkpoint file name
+
+            Returns:
+                list: checkpoint file names
+        """
+        island_num = self.__params["Island count"]
+        if island_num > 1:
+            return ["{0}.island{1}".format(checkpoint, i) for i in range(island_num)]
+        else:
+            return [checkpoint]
+
+    def __evolve(self, hof, checkpoint, resume):
+        """ Initializes (or resumes) the population and repeats evolution.
+
+            Args:
+                hof (ParetoArchive): hall of fame
+                checkpoint (str): checkpoint file name
+                resume (bool): whether the optimization is resumed or not
+
+            Returns:
+                tuple: (generation count, fitness log of the hall of fame)
+        """
+        if resume:
+            self.progress.set_description("Resuming")
+            gen_count, stall_count, fitness_hof_log = self.__load_checkpoint(checkpoint, hof)
+            self.progress.update(gen_count)
+            if not self.__logfile is None:
+                self.__logfile.write("Resume from generation {0}\n".format(gen_count))
+        else:
+            self.progress.set_description("Initilizing")
+            # generate first population
+            self.pop = self.__toolbox.population(n=self.__params["Initial population size"])
+
+            # evaluate the population
+            self.pop = self.__evaluate(self.pop)
+            if not self.__logfile is None:
+                self.__logfile.write("Initial population\n")
+                self.__logfile.write("\tcache hit = {0} miss = {1}\n".format(\
+                                        self.__cache_hit, self.__cache_miss))
+                if len(self.__routing_stats) > 0:
+                    self.__logfile.write(self.__format_routing_stats())
+
+            # start evolution
+            gen_count = 0
+            stall_count = 0
+            fitness_hof_log = []
+
+        if self.__mode == "steady-state":
+            gen_count = self.__steady_state_evolution(hof, gen_count, stall_count, \
+                                                      fitness_hof_log, checkpoint)
+        else:
+            gen_count = self.__generational_evolution(hof, gen_count, stall_count, \
+                                                      fitness_hof_log, checkpoint)
+
+        return gen_count, fitness_hof_log
 
-            if self.__quit:
-                break;
+    def __island_main(self, idx, seed, proc_num, workers, inboxes, status, checkpoint, resume):
+        """ Runs evolution of an island in a child process.
+
+            Args:
+                idx (int): island index
+                seed (int): random seed for the island
+                proc_num (int): the number of evaluation process for the island
+                workers (list of str): addresses of remote evaluation workers for the island
+                inboxes (list of multiprocessing.Queue): migrant queues of the islands
+                status (multiprocessing.Queue): queue to report status to the master
+                checkpoint (str): checkpoint file name of the island
+                resume (bool): whether the optimization is resumed or not
+
+            Returns: None
+        """
+        random.seed(seed)
+        numpy.random.seed(seed)
+        self.__island = {"index": idx, "inboxes": inboxes, "status": status}
+
+        # only the master process shows progress and writes the log
+        self.__logfile = None
+        for bar in [self.progress] + self.status_disp:
+            bar.disable = True
+        self.progress = tqdm(total=self.__params["Maximum generation"], disable=True)
+        self.status_disp = [tqdm(total=0, desc=eval_cls.name(), disable=True) \
+                            for eval_cls in self.__eval_list]
 
+        # each island has its own initial mappings
+        if idx > 0 and not resume:
+            comp_dfg, width, height = self.__random_pop_args[0:3]
+            init_maps = self.__placer.generate_init_mappings(comp_dfg, width, height, \
+                                                            count = self.__params["Initial place count"],
+                                                            proc_num = proc_num)
+            if len(init_maps) > 0:
+                self.__register_individual(self.__worker_context["CGRA"], init_maps)
+
+        self.__start_pool(proc_num, workers)
+        hof = ParetoArchive(self.__params["Archive epsilon"])
+        _, fitness_hof_log = self.__evolve(hof, checkpoint, resume)
         self.__pool.close()
         self.__pool.join()
+
+        status.put(("done", idx, [self.__dump_individual(ind) for ind in hof], fitness_hof_log))
+
+    def __run_islands(self, hof, checkpoint, resume):
+        """ Runs evolution of the islands in separate processes
+            and merges their results.
+
+            Args:
+                hof (ParetoArchive): hall of fame to store the merged results
+                checkpoint (str): checkpoint file name
+                resume (bool): whether the optimization is resumed or not
+
+            Returns:
+                tuple: (generation count, fitness log of the hall of fame)
+        """
+        island_num = self.__params["Island count"]
+        proc_num = max(1, self.__proc_num // island_num)
+        if checkpoint is None:
+            checkpoints = [None] * island_num
+        else:
+            checkpoints = self.getCheckpointFiles(checkpoint)
+
+        inboxes = [multiprocessing.Queue() for i in range(island_num)]
+        status = multiprocessing.Queue()
+        seeds = [random.getrandbits(32) for i in range(island_num)]
+        # remote workers are divided among the islands
+        if self.__workers is None:
+            island_workers = [None] * island_num
+        else:
+            island_workers = [self.__workers[i::island_num] for i in range(island_num)]
+
+        if not self.__logfile is None:
+            self.__logfile.flush()
+        islands = [multiprocessing.Process(target=self.__island_main, \
+                                           args=(i, seeds[i], proc_num, island_workers[i], \
+                                                 inboxes, status, \
+                                                 checkpoints[i], resume)) \
+                    for i in range(island_num)]
+        for island in islands:
+            island.start()
+
+        self.progress.set_description("Islands")
+        island_gen = [0] * island_num
+        results = {}
+        signaled = False
+        while len(results) < island_num:
+            # forward quit request to the islands
+            if self.__quit and not signaled:
+                for island in islands:
+                    if island.is_alive():
+                        os.kill(island.pid, signal.SIGUSR1)
+                signaled = True
+
+            try:
+                msg = status.get(timeout = 1)
+            except queue.Empty:
+                for island in islands:
+                    if not island.exitcode in (None, 0):
+                        raise RuntimeError("Island process terminated unexpectedly")
+                continue
+
+            if msg[0] == "progress":
+                idx, gen, hof_len, stall = msg[1:]
+                prev_gen = min(island_gen)
+                island_gen[idx] = gen
+                self.progress.update(min(island_gen) - prev_gen)
+                self.progress.set_postfix(island=idx, gen=gen, hof_len=hof_len, stall=stall)
+                if not self.__logfile is None:
+                    self.__logfile.write("Island {0} generation {1}\n".format(idx, gen))
+                    self.__logfile.write("\thof_len = {0} stall = {1}\n".format(hof_len, stall))
+            else:
+                idx, records, log = msg[1:]
+                results[idx] = log
+                hof.update([self.__load_individual(record) for record in records])
+
+        # an island cannot exit until its migrants are flushed to the inboxes,
+        # so the inboxes of the finished islands are drained while waiting
+        for island in islands:
+            while island.is_alive():
+                for inbox in inboxes:
+                    try:
+                        while True:
+                            inbox.get_nowait()
+                    except queue.Empty:
+                        pass
+                island.join(timeout = 0.1)
+
+        stats = self.stats.compile(hof)
+        for i in range(len(stats["min"])):
+            self.status_disp[i].set_postfix(min=stats["min"][i], max=stats["max"][i])
+
+        return min(island_gen), self.__merge_fitness_logs([results[i] for i in range(island_num)])
+
+    @staticmethod
+    def __merge_fitness_logs(logs):
+        """ Merges fitness logs of the islands.
+            For each generation, non-dominated fitnesses among the islands are kept.
+            An island finished earlier than the others keeps its last fitnesses.
+
+            Args:
+                logs (list): fitness logs of the islands
+
+            Returns:
+                list: merged fitness log
+        """
+        merged = []
+        for gen in range(max([len(log) for log in logs])):
+            values = set()
+            for log in logs:
+                if len(log) > 0:
+                    values |= set(log[min(gen, len(log) - 1)])
+            fits = [creator.Fitness(v) for v in sorted(values)]
+            merged.append([fit.values for fit in fits \
+                           if not any([other.dominates(fit) for other in fits])])
+        return merged
+
+    def runOptimization(self, checkpoint = None, resume = False):
+        """ Runs the optimization.
+
+            Option:
+                checkpoint (str): checkpoint file name
+                                  If it is None, no checkpoint is saved.
+                                  Otherwise, the optimization state is saved
+                                  at the interval of "Checkpoint interval" generations.
+                resume (bool): if it is True, the optimization is resumed
+                               from the checkpoint file.
+
+            Returns:
+                tuple: (hall of fame, fitness log of the hall of fame)
+        """
+        # hall of fame
+        hof = ParetoArchive(self.__params["Archive epsilon"])
+
+        if self.__params["Island count"] > 1:
+            gen_count, fitness_hof_log = self.__run_islands(hof, checkpoint, resume)
+        else:
+            gen_count, fitness_hof_log = self.__evolve(hof, checkpoint, resume)
+            self.__pool.close()
+            self.__pool.join()
+
         if self.__params["Maximum generation"] > gen_count:
             self.progress.update(self.__params["Maximum generation"] - gen_count)
         self.progress.close()
@@ -482,6 +1303,9 @@ class NSGA2():
 
         # eleminate invalid individuals
         hof = [ind for ind in hof if ind.isValid()]
+        # routed graphs are needed only for the final results
+        for ind in hof:
+            ind.restoreRoutedGraph()
 
         return hof, fitness_hof_log
 
@@ -1,7 +1,7 @@
 #  This file is part of GenMap and released under the MIT License, see LICENSE.
 #  Author: Takuya Kojima
 
-from EvalBase import EvalBase
+from EvalBase import EvalBase, COST_CHEAP
 
 class OpMapHeightEval(EvalBase):
     def __init__(self):
@@ -31,4 +31,8 @@ class OpMapHeightEval(EvalBase):
 
     @staticmethod
     def name():
-        return "Op_Mapping_Height"
\ No newline at end of file
+        return "Op_Mapping_Height"
+
+    @staticmethod
+    def costClass():
+        return COST_CHEAP
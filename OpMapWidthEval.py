@@ -1,7 +1,7 @@
 #  This file is part of GenMap and released under the MIT License, see LICENSE.
 #  Author: Takuya Kojima
 
-from EvalBase import EvalBase
+from EvalBase import EvalBase, COST_CHEAP
 
 class OpMapWidthEval(EvalBase):
     def __init__(self):
@@ -31,4 +31,8 @@ class OpMapWidthEval(EvalBase):
 
     @staticmethod
     def name():
-        return "Op_Mapping_Width"
\ No newline at end of file
+        return "Op_Mapping_Width"
+
+    @staticmethod
+    def costClass():
+        return COST_CHEAP
@@ -0,0 +1,237 @@
+#  This file is part of GenMap and released under the MIT License, see LICENSE.
+#  Author: Takuya Kojima
+
+from collections.abc import MutableMapping
+import networkx as nx
+import copy
+
+class _CopyOnWriteDict(MutableMapping):
+    """Dict-like object sharing the values with a base dict until they are accessed.
+        At the first access to a value, it is copied from the base dict,
+        so that the base dict is never modified.
+    """
+    __slots__ = ("_base", "_copy_value", "_data", "_deleted", "_added")
+
+    def __init__(self, base, copy_value):
+        """
+            Args:
+                base (dict): the base dict
+                copy_value (function): a function receiving a key and the base value,
+                                       and returning a copy of the value
+        """
+        self._base = base
+        self._copy_value = copy_value
+        # copied or added values
+        self._data = {}
+        # deleted keys of the base dict
+        self._deleted = set()
+        # added keys not in the base dict (as an ordered set)
+        self._added = {}
+
+    def __getitem__(self, key):
+        try:
+            return self._data[key]
+        except KeyError:
+            pass
+        if key in self._deleted:
+            raise KeyError(key)
+        value = self._copy_value(key, self._base[key])
+        self._data[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        self._data[key] = value
+        if key in self._base:
+            self._deleted.discard(key)
+        else:
+            self._added[key] = None
+
+    def __delitem__(self, key):
+        if not key in self:
+            raise KeyError(key)
+        self._data.pop(key, None)
+        if key in self._base:
+            self._deleted.add(key)
+        else:
+            del self._added[key]
+
+    def __contains__(self, key):
+        return key in self._data or (key in self._base and not key in self._deleted)
+
+    def __iter__(self):
+        deleted = self._deleted
+        for key in self._base:
+            if not key in deleted:
+                yield key
+        yield from list(self._added)
+
+    def __len__(self):
+        return len(self._base) - len(self._deleted) + len(self._added)
+
+    def peek(self, key):
+        """Returns the value without copying it.
+            The returned value must not be modified.
+        """
+        try:
+            return self._data[key]
+        except KeyError:
+            pass
+        if key in self._deleted:
+            raise KeyError(key)
+        return self._base[key]
+
+    def peekItems(self):
+        """Iterates over items without copying the values.
+            The returned values must not be modified.
+        """
+        data = self._data
+        deleted = self._deleted
+        for key, value in self._base.items():
+            if key in data:
+                yield key, data[key]
+            elif not key in deleted:
+                yield key, value
+        for key in list(self._added):
+            yield key, data[key]
+
+class OverlayGraph(nx.DiGraph):
+    def __init__(self, incoming_graph_data = None, base = None, **attr):
+        """Directed graph as an overlay on a shared base graph.
+            Nodes, adjacencies and their attributes are copied from the base graph
+            only when they are accessed, and the base graph is never modified.
+            So, the base graph must not be modified while the overlay is used.
+
+            It can be used in the same way as networkx DiGraph.
+            When it is pickled or deep-copied, the result is a plain DiGraph.
+
+            Args:
+                incoming_graph_data: same as networkx DiGraph
+                                     It must be None if base is specified.
+                Option:
+                    base (networkx DiGraph): the base graph
+                    attr: graph attributes
+        """
+        super().__init__(incoming_graph_data, **attr)
+        if not base is None:
+            self.graph = dict(base.graph, **attr)
+            # edge attributes shared by the successor and predecessor dicts
+            #   key: edge
+            #   value: copied attributes
+            edge_attrs = {}
+
+            def copy_nbrs(nbrs, edges):
+                copied = {}
+                for (n, attr), e in zip(nbrs.items(), edges):
+                    edge_attr = edge_attrs.get(e)
+                    if edge_attr is None:
+                        edge_attr = edge_attrs[e] = dict(attr)
+                    copied[n] = edge_attr
+                return copied
+
+            self._node = _CopyOnWriteDict(base._node, lambda v, attr: dict(attr))
+            self._succ = self._adj = _CopyOnWriteDict(base._succ, \
+                lambda u, nbrs: copy_nbrs(nbrs, [(u, v) for v in nbrs]))
+            self._pred = _CopyOnWriteDict(base._pred, \
+                lambda v, nbrs: copy_nbrs(nbrs, [(u, v) for u in nbrs]))
+
+    def isOverlay(self):
+        """Returns whether the graph still refers the base graph.
+        """
+        return isinstance(self._node, _CopyOnWriteDict)
+
+    def peekNodes(self):
+        """Iterates over nodes and their attributes without copying them.
+            The attributes must not be modified.
+
+            Returns:
+                iterator of (node, attributes)
+        """
+        if self.isOverlay():
+            return self._node.peekItems()
+        return iter(self._node.items())
+
+    def peekEdges(self):
+        """Iterates over edges and their attributes without copying them.
+            The attributes must not be modified.
+
+            Returns:
+                iterator of (src, dst, attributes)
+        """
+        if self.isOverlay():
+            nodes_nbrs = self._succ.peekItems()
+        else:
+            nodes_nbrs = self._succ.items()
+        return ((u, v, attr) for u, nbrs in nodes_nbrs for v, attr in nbrs.items())
+
+    def peekSucc(self, u):
+        """Returns successors of a node and the edge attributes without copying them.
+            The returned dict must not be modified.
+
+            Returns:
+                dict: keys are successors and values are edge attributes
+        """
+        return self.__peek(self._succ, u)
+
+    def detach(self, nodes = None, edges = None):
+        """Replaces the overlay with a plain copy so that it no longer refers the base graph.
+            Only the specified nodes and edges are left if given.
+            The order of nodes and adjacencies is kept as it is.
+
+            Option:
+                nodes (list): nodes to be left
+                edges (list): edges to be left
+                              Edges whose ends are not left are ignored.
+        """
+        node_attrs = dict(self.peekNodes())
+        if nodes is None:
+            nodes = node_attrs.keys()
+        new_node = {v: dict(node_attrs[v]) for v in nodes}
+        if edges is None:
+            edges = [(u, v) for u, v, _ in self.peekEdges()]
+        edge_attrs = {(u, v): dict(self.peekSucc(u)[v]) for u, v in edges \
+                        if u in new_node and v in new_node}
+
+        self._node = new_node
+        self._succ = self._adj = {u: {v: edge_attrs[(u, v)] for v in self.__peek(self._succ, u) \
+                                      if (u, v) in edge_attrs} for u in new_node}
+        self._pred = {v: {u: edge_attrs[(u, v)] for u in self.__peek(self._pred, v) \
+                          if (u, v) in edge_attrs} for v in new_node}
+        # cached views refer the old dicts
+        self.__dict__.pop("nodes", None)
+
+    @staticmethod
+    def __peek(adj, v):
+        if isinstance(adj, _CopyOnWriteDict):
+            return adj.peek(v)
+        return adj[v]
+
+    def number_of_edges(self, u = None, v = None):
+        if u is None:
+            if self.isOverlay():
+                return sum([len(nbrs) for _, nbrs in self._succ.peekItems()])
+            return sum([len(nbrs) for nbrs in self._succ.values()])
+        return super().number_of_edges(u, v)
+
+    def copy(self, as_view = False):
+        if as_view:
+            return super().copy(as_view)
+        return self.__plain_copy(copy.copy)
+
+    def __plain_copy(self, copy_func):
+        """Makes a plain DiGraph with the same nodes, edges and attributes.
+
+            Args:
+                copy_func (function): a function to copy attributes
+        """
+        G = nx.DiGraph()
+        G.graph.update(copy_func(self.graph))
+        G.add_nodes_from([(v, copy_func(attr)) for v, attr in self.peekNodes()])
+        G.add_edges_from([(u, v, copy_func(attr)) for u, v, attr in self.peekEdges()])
+        return G
+
+    def __deepcopy__(self, memo):
+        return self.__plain_copy(lambda obj: copy.deepcopy(obj, memo))
+
+    def __reduce__(self):
+        # the base graph is not pickled
+        return (nx.DiGraph, (), self.__plain_copy(copy.copy).__dict__)
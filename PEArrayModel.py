@@ -1,8 +1,18 @@
 #  This file is part of GenMap and released under the MIT License, see LICENSE.
 #  Author: Takuya Kojima
 
+from CompiledNetwork import CompiledNetwork
+from OverlayGraph import OverlayGraph
+
 import networkx as nx
+import numpy as np
+import xml.etree.ElementTree as ET
 import copy
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
 
 ALU_node_exp = "ALU_{pos[0]}_{pos[1]}"
 SE_node_exp = "SE_{id}_{name}_{pos[0]}_{pos[1]}"
@@ -14,6 +24,68 @@ DEFAULT_EDGE_WEIGHT = {"ALU": 1, "SE": 1, "IN_PORT": 0, "OUT_PORT": 0, "Const":
 
 DEFAULT_MUX_NUM = 2
 
+# element types of the nodes
+NODE_TYPES = ["ALU", "SE", "Const", "IN_PORT", "OUT_PORT"]
+
+# default directory of the model cache
+DEFAULT_MODEL_CACHE = os.path.join(os.path.expanduser("~"), ".cache", "GenMap")
+# source files of the cached objects
+# the cache is invalidated when they are changed
+MODEL_CACHE_SOURCES = ["PEArrayModel.py", "CompiledNetwork.py", "OverlayGraph.py"]
+
+# digest of the source files and the library versions (calculated once)
+_source_digest = None
+
+def _cache_digest(*items):
+    """Returns a digest of the items for the model cache.
+        It also depends on the source files of the model and the library versions.
+    """
+    global _source_digest
+    if _source_digest is None:
+        h = hashlib.sha256()
+        h.update(repr((sys.version_info[:2], nx.__version__, np.__version__)).encode())
+        src_dir = os.path.dirname(os.path.abspath(__file__))
+        for name in MODEL_CACHE_SOURCES:
+            with open(os.path.join(src_dir, name), "rb") as f:
+                h.update(f.read())
+        _source_digest = h.digest()
+
+    h = hashlib.sha256(_source_digest)
+    for item in items:
+        h.update(item if isinstance(item, bytes) else repr(item).encode())
+    return h.hexdigest()
+
+def _read_cache(cache_dir, name):
+    """Reads an object from the model cache.
+
+        Returns:
+            the cached object (None if not cached)
+    """
+    try:
+        with open(os.path.join(cache_dir, name), "rb") as f:
+            return pickle.load(f)
+    except Exception:
+        # missing or broken cache
+        return None
+
+def _write_cache(cache_dir, name, obj):
+    """Writes an object to the model cache.
+        The file is replaced atomically so that other processes
+        never read a broken cache. Failures are ignored.
+    """
+    try:
+        os.makedirs(cache_dir, exist_ok = True)
+        fd, tmp = tempfile.mkstemp(dir = cache_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(obj, f, protocol = pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, os.path.join(cache_dir, name))
+        except Exception:
+            os.remove(tmp)
+            raise
+    except Exception:
+        pass
+
 class PEArrayModel():
 
     class InvalidConfigError(Exception):
@@ -116,6 +188,18 @@ class PEArrayModel():
         self.__out_port_range = []
         self.__inout_used = True
         self.__link_weight = {}
+        # integer-indexed network compiled on demand
+        self.__compiled_network = None
+        # distance tables between the resources and ALUs made on demand
+        #   key: element type
+        #   value: distance table
+        self.__distance_tables = {}
+        # initial attributes set by setInitEdgeAttr
+        #   list of (attr name, attr value, edge type)
+        self.__init_edge_attrs = []
+        # model cache (see load)
+        #   (cache directory, digest of the architecture file)
+        self.__cache = None
 
         # operation list supported by the PEs
         #    1st index: pos_x
@@ -147,6 +231,32 @@ class PEArrayModel():
         # SEs whose return_only attr is True
         self.__return_only_se = []
 
+        # metadata of each node made at load time
+        #   element type
+        #       key: node name
+        #       value: "ALU", "SE", "Const", "IN_PORT" or "OUT_PORT"
+        self.__node_types = {}
+        #   PE coordinate
+        #       key: node name of ALU or SE
+        #       value: coord
+        self.__node_coords = {}
+        #   SE ID
+        #       key: node name of SE
+        #       value: SE ID
+        self.__se_ids = {}
+        #   body bias domain
+        #       key: node name of ALU or SE in a domain
+        #       value: domain name
+        self.__node_domains = {}
+        #   set of the return only SEs
+        self.__return_only_set = set()
+        #   node name table for getNodeName
+        #       1st key: element type
+        #       2nd key: coord for ALU, (coord, SE ID, output name) for SE,
+        #                otherwise index
+        #       value: node name
+        self.__node_names = {etype: {} for etype in NODE_TYPES}
+
         # network configuration data value
         #    1st key: successor node name
         #    2nd key: predecessor node name
@@ -233,7 +343,7 @@ class PEArrayModel():
         else:
             self.__const_reg_range = list(range(int(const_str)))
         for c_reg in self.__const_reg_range:
-            self.__network.add_node(CONST_node_exp.format(index=c_reg))
+            self.__add_node(CONST_node_exp.format(index=c_reg), "Const", c_reg)
 
         # init PE array inout port
         inoutport_str = conf.get("inout_port")
@@ -273,9 +383,9 @@ class PEArrayModel():
 
         # make input, output port nodes
         for i in self.__in_port_range:
-            self.__network.add_node(IN_PORT_node_exp.format(index=i))
+            self.__add_node(IN_PORT_node_exp.format(index=i), "IN_PORT", i)
         for i in self.__out_port_range:
-            self.__network.add_node(OUT_PORT_node_exp.format(index=i))
+            self.__add_node(OUT_PORT_node_exp.format(index=i), "OUT_PORT", i)
 
         # init operation list
         self.__operation_list = [[[] for y in range(self.__height)] for x in range(self.__width)]
@@ -345,9 +455,10 @@ class PEArrayModel():
                     raise self.InvalidConfigError("Mux count for ALU({0},{1}) must be positive integer but {2} was specified".format(\
                             x, y, mux_num))
                 self.__mux_count[x][y] = mux_num
-            self.__network.add_node(ALU_node_exp.format(pos=(x, y)))
+            self.__add_node(ALU_node_exp.format(pos=(x, y)), "ALU", (x, y))
             if not pe.get("bbdomain") is None:
                 self.__bb_domains[pe.get("bbdomain")]["ALU"].append(ALU_node_exp.format(pos=(x, y)))
+                self.__node_domains[ALU_node_exp.format(pos=(x, y))] = pe.get("bbdomain")
             for op in ALU.iter("operation"):
                 if str(op.text) != "":
                     self.__operation_list[x][y].append(str(op.text))
@@ -391,10 +502,11 @@ class PEArrayModel():
                     if output.get("name") is None:
                         raise self.InvalidConfigError("missing output name of SE at ({0}, {1})".format((x, y)))
                     se_node_name = SE_node_exp.format(pos=(x, y), name=output.get("name"), id=se_id)
-                    self.__network.add_node(se_node_name)
+                    self.__add_node(se_node_name, "SE", ((x, y), se_id, output.get("name")))
                     if not pe.get("bbdomain") is None:
                         self.__bb_domains[pe.get("bbdomain")]["SE"].append(\
                                 se_node_name)
+                        self.__node_domains[se_node_name] = pe.get("bbdomain")
                     connections[se_node_name] = output.iter("input")
                     if not se_id in self.__se_lists[(x, y)].keys():
                         self.__se_lists[(x, y)][se_id] = set()
@@ -402,6 +514,7 @@ class PEArrayModel():
                     self.__output_names[se_node_name] = output.get("name")
                     if output.get("return_only") == "True":
                         self.__return_only_se.append(se_node_name)
+                        self.__return_only_set.add(se_node_name)
 
         # get output connections
         for ele in conf:
@@ -428,7 +541,6 @@ class PEArrayModel():
         for dst, srcs in connections.items():
             self.__make_connection(dst, srcs)
 
-
         # get input position setting
         for ele in conf:
             if ele.tag == "IN_PORT":
@@ -569,6 +681,71 @@ class PEArrayModel():
             # save the init weight value to restore
             self.__link_weight[(src_node, dst)] = attr["weight"]
 
+    def __add_node(self, node, etype, key):
+        """Adds a node to the network and registers it to the node tables.
+
+            Args:
+                node (str): node name
+                etype (str): element type
+                key: key of the node name table (see __init__)
+        """
+        self.__network.add_node(node)
+        self.__register_node(node, etype, key)
+
+    def __register_node(self, node, etype, key):
+        """Registers a node to the node tables (see __add_node).
+        """
+        self.__node_types[node] = etype
+        self.__node_names[etype][key] = node
+        if etype == "ALU":
+            self.__node_coords[node] = key
+        elif etype == "SE":
+            self.__node_coords[node] = key[0]
+            self.__se_ids[node] = key[1]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # the compiled network (with its shortest path trees) and
+        # the distance tables are remade on demand after unpickling
+        del state["_PEArrayModel__compiled_network"]
+        del state["_PEArrayModel__distance_tables"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__compiled_network = None
+        self.__distance_tables = {}
+        # models pickled by older versions (e.g., in dump files)
+        # do not have the caches and the node tables made at load time
+        for name, value in [("init_edge_attrs", []), ("cache", None)]:
+            self.__dict__.setdefault("_PEArrayModel__" + name, value)
+        if not "_PEArrayModel__node_names" in state:
+            self.__rebuild_node_tables()
+
+    def __rebuild_node_tables(self):
+        """Makes the node tables from the node names in the network.
+        """
+        self.__node_types = {}
+        self.__node_coords = {}
+        self.__se_ids = {}
+        self.__node_names = {etype: {} for etype in NODE_TYPES}
+        for v in self.__network.nodes():
+            if self.isALU(v):
+                _, x, y = v.split("_")
+                self.__register_node(v, "ALU", (int(x), int(y)))
+            elif self.isSE(v):
+                # output name may include "_"
+                _, se_id, rest = v.split("_", 2)
+                name, x, y = rest.rsplit("_", 2)
+                self.__register_node(v, "SE", ((int(x), int(y)), int(se_id), name))
+            else:
+                etype, index = v.rsplit("_", 1)
+                self.__register_node(v, "Const" if etype == "CONST" else etype, int(index))
+
+        self.__node_domains = {v: domain for domain, nodes in self.__bb_domains.items() \
+                                for etype_nodes in nodes.values() for v in etype_nodes}
+        self.__return_only_set = set(self.__return_only_se)
+
     def __coord_str2tuple(self, s):
         """convert a string of 2D coordinate to a tuple
         """
@@ -661,6 +838,67 @@ class PEArrayModel():
                 "conf_value": conf_val, "weight": weight}
 
 
+    @staticmethod
+    def load(arch_file, cache_dir = DEFAULT_MODEL_CACHE):
+        '''Loads a model from an architecture definition file.
+        The model made from the file is cached in the cache directory
+        with a key made from the file content, and it is reused while
+        the file is not changed.
+        Also, the compiled network and the distance tables are cached
+        with the initial edge attributes (the default weights of the router).
+
+        Args:
+            arch_file (str): architecture definition file name
+            Option:
+                cache_dir (str): cache directory
+                                 If it is None, the cache is not used.
+
+        Return:
+            PEArrayModel: the model
+
+        Raise:
+            xml.etree.ElementTree.ParseError: if the file is not a valid XML
+            ValueError or InvalidConfigError: if there exist invalid configurations
+        '''
+        with open(arch_file, "rb") as f:
+            data = f.read()
+        digest = _cache_digest(data)
+
+        model = None
+        if not cache_dir is None:
+            model = _read_cache(cache_dir, digest + ".model")
+        if model is None:
+            root = ET.fromstring(data)
+            if root.tag != "PEArray":
+                raise PEArrayModel.InvalidConfigError("Root tag name must be \"PEArray\"")
+            model = PEArrayModel(root)
+            if not cache_dir is None:
+                _write_cache(cache_dir, digest + ".model", model)
+
+        if not cache_dir is None:
+            model.__cache = (cache_dir, digest)
+        return model
+
+    def __cached_index(self, name, make):
+        '''Returns an index of the model from the cache or makes it.
+
+        Args:
+            name (str): name of the index
+            make (function): a function to make the index
+
+        Return:
+            the index
+        '''
+        if self.__cache is None:
+            return make()
+        cache_dir, digest = self.__cache
+        key = _cache_digest(digest, self.__init_edge_attrs, name) + ".index"
+        index = _read_cache(cache_dir, key)
+        if index is None:
+            index = make()
+            _write_cache(cache_dir, key, index)
+        return index
+
     # getter method
     def getArchName(self):
         '''Returns architecture name of this model
@@ -675,14 +913,84 @@ class PEArrayModel():
 
     def getNetwork(self):
         '''Returns a networkx object as the PE array model
+        It is an overlay on the network of this model,
+        and the nodes and edges are copied only when they are accessed.
 
         Args:
             None
 
         Return:
-            networkx DiGraph: PE array network
+            OverlayGraph: PE array network
         '''
-        return copy.deepcopy(self.__network)
+        return OverlayGraph(base = self.__network)
+
+    def getCompiledNetwork(self):
+        '''Returns an integer-indexed representation of the PE array network
+        It is compiled only once unless the initial edge attributes are changed.
+
+        Args:
+            None
+
+        Return:
+            CompiledNetwork: compiled PE array network
+        '''
+        if self.__compiled_network is None:
+            # link weights are the lower bounds of the weights set by routers
+            self.__compiled_network = self.__cached_index("compiled", \
+                lambda: CompiledNetwork(self.__network, self.__node_coords, self.__link_weight))
+        return self.__compiled_network
+
+    def getDistanceTable(self, etype):
+        '''Returns shortest path distances between the resources and ALUs
+        on the empty PE array network weighted by the link weights.
+        They are calculated only once for each type, and are
+        lower bounds of the distances on the routed graphs.
+
+        Args:
+            etype (str): type of the resources
+                Available types are "Const", "IN_PORT" and "OUT_PORT"
+
+        Return:
+            dict: distance table
+                keys (str): resource names
+                values (dict): distance for each ALU
+                    For "OUT_PORT", distance from the ALU to the port,
+                    otherwise, from the resource to the ALU.
+                    ALUs which cannot be reached are not included.
+        '''
+        if not etype in self.__distance_tables:
+            self.__distance_tables[etype] = \
+                self.__cached_index("distance_" + etype, lambda: self.__make_distance_table(etype))
+
+        return self.__distance_tables[etype]
+
+    def __make_distance_table(self, etype):
+        '''Makes a distance table (see getDistanceTable).
+        '''
+        if etype == "Const":
+            resources = self.getConstRegs()
+        elif etype == "IN_PORT":
+            resources = self.getInputPorts()
+        elif etype == "OUT_PORT":
+            resources = self.getOutputPorts()
+        else:
+            raise ValueError("Unknown resource type: " + etype)
+
+        if etype == "OUT_PORT":
+            # search from the ports on the reversed network
+            graph = self.__network.reverse(copy = False)
+            weight = lambda u, v, attr: self.__link_weight[(v, u)]
+        else:
+            graph = self.__network
+            weight = lambda u, v, attr: self.__link_weight[(u, v)]
+
+        table = {}
+        for res in resources:
+            if not graph.has_node(res):
+                continue
+            dist = nx.single_source_dijkstra_path_length(graph, res, weight = weight)
+            table[res] = {v: d for v, d in dist.items() if self.isALU(v)}
+        return table
 
     def getNodeName(self, etype, pos=None, index=None, se_id=None, link_name=None):
         '''Returns a node name of PE array network
@@ -701,6 +1009,18 @@ class PEArrayModel():
             str: the node name if exist
                 if not exist, returns null string
         '''
+        # look up the table made at load time
+        try:
+            if etype == "ALU":
+                return self.__node_names["ALU"][(pos[0], pos[1])]
+            elif etype == "SE":
+                return self.__node_names["SE"][((pos[0], pos[1]), se_id, link_name)]
+            else:
+                return self.__node_names[etype][index]
+        except (KeyError, TypeError):
+            # invalid arguments or a node which does not exist
+            pass
+
         if etype == "ALU" and not pos is None:
             node_name = ALU_node_exp.format(pos=pos)
         elif etype == "SE" and not pos is None and \
@@ -720,6 +1040,21 @@ class PEArrayModel():
         else:
             raise TypeError(node_name + " does not exist")
 
+    def getMappedALUs(self, mapping):
+        '''Returns ALU node names for a mapping
+
+        Args:
+            mapping (dict): keys are DFG nodes and values are ALU coords
+
+        Return:
+            dict: keys are the DFG nodes and values are the ALU node names
+        '''
+        alu_names = self.__node_names["ALU"]
+        try:
+            return {v: alu_names[(pos[0], pos[1])] for v, pos in mapping.items()}
+        except KeyError:
+            # raise the same error as getNodeName
+            return {v: self.getNodeName("ALU", pos = pos) for v, pos in mapping.items()}
 
     def setInitEdgeAttr(self, attr_name, attr, edge_type = None):
         """ Set initial attributes to edges in the network model.
@@ -737,21 +1072,26 @@ class PEArrayModel():
                 None
         """
 
+        # overlays made so far refer the current network
+        # (deep copy keeps the order of the adjacencies)
+        self.__network = copy.deepcopy(self.__network)
+
         if edge_type is None:
             nx.set_edge_attributes(self.__network, attr, attr_name)
         else:
-            if edge_type == "ALU":
-                edges = {(u, v): {attr_name: attr} for u, v in self.__network.edges() if u.find("ALU") == 0}
-            elif edge_type == "SE":
-                edges = {(u, v): {attr_name: attr} for u, v in self.__network.edges() if u.find("SE") == 0}
-            elif edge_type == "Const":
-                edges = {(u, v): {attr_name: attr} for u, v in self.__network.edges() if u.find("CONST") == 0}
-            elif edge_type == "IN_PORT":
-                edges = {(u, v): {attr_name: attr} for u, v in self.__network.edges() if u.find("IN_PORT") == 0}
-            elif edge_type == "OUT_PORT":
-                edges = {(u, v): {attr_name: attr} for u, v in self.__network.edges() if v.find("OUT_PORT") == 0}
+            types = self.__node_types
+            if edge_type == "OUT_PORT":
+                edges = {(u, v): {attr_name: attr} for u, v in self.__network.edges() \
+                            if types[v] == "OUT_PORT"}
+            else:
+                edges = {(u, v): {attr_name: attr} for u, v in self.__network.edges() \
+                            if types[u] == edge_type}
 
             nx.set_edge_attributes(self.__network, edges)
+        self.__init_edge_attrs.append((attr_name, attr, edge_type))
+
+        # the compiled network is no longer valid
+        self.__compiled_network = None
 
     def getBBdomains(self):
         """Returns body bias domains of the PE array.
@@ -838,6 +1178,104 @@ class PEArrayModel():
     def getPregPositions(self):
         return self.__preg_positions
 
+    def getNodeType(self, node):
+        """Returns element type of a node.
+
+            Args:
+                node (str): node name
+
+            Returns:
+                str: "ALU", "SE", "Const", "IN_PORT" or "OUT_PORT"
+                     If the node does not exist, returns None.
+        """
+        return self.__node_types.get(node)
+
+    def getNodeCoord(self, node):
+        """Returns coordinate of the PE including a node.
+
+            Args:
+                node (str): node name
+
+            Returns:
+                tuple: the coordinate
+                       If the node is neither ALU nor SE, returns None.
+        """
+        return self.__node_coords.get(node)
+
+    def getSEId(self, node):
+        """Returns ID of an SE.
+
+            Args:
+                node (str): node name of the SE
+
+            Returns:
+                int: SE ID
+                     If the node is not SE, returns None.
+        """
+        return self.__se_ids.get(node)
+
+    def getNodeBBdomain(self, node):
+        """Returns body bias domain including a node.
+
+            Args:
+                node (str): node name
+
+            Returns:
+                str: domain name
+                     If the node does not belong to any domain, returns None.
+        """
+        return self.__node_domains.get(node)
+
+    def isReturnOnly(self, node):
+        """Checks whether the node is a return only SE.
+
+            Args:
+                node (str): node name
+
+            Returns:
+                bool: if the node is a return only SE, return True.
+                      otherwise return False.
+        """
+        return node in self.__return_only_set
+
+    def getNodeStage(self, node, preg_config):
+        """Returns pipeline stage of a node.
+            It is the index of the stage including the node in getStageDomains.
+
+            Args:
+                node (str): node name
+                preg_config (list of Boolean): pipeline register configuration
+
+            Returns:
+                int: stage index
+                     If the node is neither ALU nor SE, returns -1.
+        """
+        if not node in self.__node_coords:
+            return -1
+        if node in self.__return_only_set:
+            # the last stage
+            return sum(preg_config)
+        return self.__row_stages(preg_config)[self.__node_coords[node][1]]
+
+    def __row_stages(self, preg_config):
+        """Returns pipeline stage of each row of the PE array.
+
+            Args:
+                preg_config (list of Boolean): pipeline register configuration
+
+            Returns:
+                list: stage index for each y coordinate
+        """
+        stage = 0
+        active_preg_positions = [self.__preg_positions[i] for i in range(len(self.__preg_positions)) if preg_config[i] == True]
+        stages = []
+        for y in range(self.__height):
+            if stage < len(active_preg_positions):
+                if active_preg_positions[stage] <= y:
+                    stage += 1
+            stages.append(stage)
+        return stages
+
 
     def getFreeSEs(self, routed_graph, x_range=None, y_range=None):
         """Gets unused SEs.
@@ -885,24 +1323,19 @@ class PEArrayModel():
                         1st index is to specify the stage
                         2nd index is to specify the resource node
         """
-        stage = 0
         rtn_list = [[] for stage in range(sum(preg_config) + 1)]
-
-        # activated preg positions
-        active_preg_positions = [self.__preg_positions[i] for i in range(len(self.__preg_positions)) if preg_config[i] == True]
+        row_stages = self.__row_stages(preg_config)
 
         # get nodes for each stage
         se_set = set()
         for y in range(self.__height):
-            if stage < len(active_preg_positions):
-                if active_preg_positions[stage] <= y:
-                    stage += 1
+            stage = row_stages[y]
             # add ALU
             rtn_list[stage].extend([ALU_node_exp.format(pos=(x, y)) for x in range(self.__width)])
             # add SE
             for x in range(self.__width):
                 se_set = set([se for subset in self.__se_lists[(x, y)].values() for se in subset])
-                rtn_list[stage].extend([se for se in se_set if not se in self.__return_only_se])
+                rtn_list[stage].extend([se for se in se_set if not se in self.__return_only_set])
         else:
             if remove_return_se:
                 rtn_list[-1].extend(list(set(self.__return_only_se) & se_set))
@@ -0,0 +1,266 @@
+#  This file is part of GenMap and released under the MIT License, see LICENSE.
+#  Author: Takuya Kojima
+
+from bisect import bisect_right
+from operator import eq
+import math
+
+# maximum number of points in a leaf of ND-tree
+LEAF_SIZE = 20
+# the number of children made by splitting a leaf
+BRANCH_NUM = 6
+
+def _dominates(lhs, rhs):
+    """Returns whether lhs dominates rhs (for maximization).
+    """
+    not_equal = False
+    for l, r in zip(lhs, rhs):
+        if l > r:
+            not_equal = True
+        elif l < r:
+            return False
+    return not_equal
+
+def _weakly_dominates(lhs, rhs):
+    for l, r in zip(lhs, rhs):
+        if l < r:
+            return False
+    return True
+
+class _NDNode():
+    """Node of ND-tree.
+        A node keeps the ideal (component-wise max) and nadir (component-wise min)
+        points of the points under it, which are used to prune dominance queries.
+    """
+    __slots__ = ("ideal", "nadir", "points", "children", "parent")
+
+    def __init__(self, parent = None):
+        self.ideal = None
+        self.nadir = None
+        # list of (key, item) for a leaf, otherwise None
+        self.points = []
+        self.children = None
+        self.parent = parent
+
+    def extend_bounds(self, key):
+        if self.ideal is None:
+            self.ideal = tuple(key)
+            self.nadir = tuple(key)
+        else:
+            self.ideal = tuple([max(a, b) for a, b in zip(self.ideal, key)])
+            self.nadir = tuple([min(a, b) for a, b in zip(self.nadir, key)])
+
+    def distance(self, key):
+        return sum([((i + n) / 2 - k) ** 2 for i, n, k in zip(self.ideal, self.nadir, key)])
+
+class NDTree():
+    def __init__(self):
+        """Spatial index for mutually non-dominated points.
+            See J. Jaszkiewicz and T. Lust, "ND-Tree-Based Update: A Fast Algorithm
+            for the Dynamic Nondominance Problem", IEEE TEVC, 2018.
+        """
+        self.__root = _NDNode()
+
+    def insert(self, key, item):
+        node = self.__root
+        node.extend_bounds(key)
+        while not node.children is None:
+            node = min(node.children, key = lambda child: child.distance(key))
+            node.extend_bounds(key)
+        node.points.append((key, item))
+        if len(node.points) > LEAF_SIZE:
+            self.__split(node)
+
+    def remove(self, key, item):
+        leaf = self.__find_leaf(self.__root, key, item)
+        if leaf is None:
+            return
+        leaf.points = [p for p in leaf.points if not p[1] is item]
+        # eliminate empty nodes
+        # (bounds of the ancestors are left as they are since they are still valid)
+        node = leaf
+        while len(node.points if node.children is None else node.children) == 0 \
+                and not node.parent is None:
+            node.parent.children.remove(node)
+            node = node.parent
+        if node is self.__root and node.children == []:
+            self.__root = _NDNode()
+
+    def findDominating(self, key):
+        """Returns an item whose key dominates the given key, or None.
+        """
+        stack = [self.__root]
+        while len(stack) > 0:
+            node = stack.pop()
+            if node.ideal is None or not _weakly_dominates(node.ideal, key):
+                continue
+            if node.children is None:
+                for p_key, item in node.points:
+                    if _dominates(p_key, key):
+                        return item
+            else:
+                stack.extend(node.children)
+        return None
+
+    def findEqual(self, key):
+        """Returns items having the same key.
+        """
+        return [item for p_key, item in self.__search_box(key, key) if p_key == key]
+
+    def findDominated(self, key):
+        """Returns items whose keys are dominated by the given key.
+        """
+        return [item for p_key, item in self.__search_box(key, None) if _dominates(key, p_key)]
+
+    def __search_box(self, upper, lower):
+        """Returns points in the box between lower and upper (None means unbounded).
+        """
+        result = []
+        stack = [self.__root]
+        while len(stack) > 0:
+            node = stack.pop()
+            if node.ideal is None or not _weakly_dominates(upper, node.nadir):
+                continue
+            if not lower is None and not _weakly_dominates(node.ideal, lower):
+                continue
+            if node.children is None:
+                result.extend(node.points)
+            else:
+                stack.extend(node.children)
+        return result
+
+    def __find_leaf(self, node, key, item):
+        if node.ideal is None or not (_weakly_dominates(node.ideal, key) and \
+                                      _weakly_dominates(key, node.nadir)):
+            return None
+        if node.children is None:
+            for _, p_item in node.points:
+                if p_item is item:
+                    return node
+            return None
+        for child in node.children:
+            leaf = self.__find_leaf(child, key, item)
+            if not leaf is None:
+                return leaf
+        return None
+
+    @staticmethod
+    def __split(node):
+        """Splits a leaf into children by clustering around distant seeds.
+        """
+        points = node.points
+        seeds = [points[0][0]]
+        while len(seeds) < BRANCH_NUM:
+            # the farthest point from the current seeds
+            far_key = max([key for key, _ in points], \
+                          key = lambda k: min([sum([(a - b) ** 2 for a, b in zip(k, s)]) \
+                                                for s in seeds]))
+            if far_key in seeds:
+                break
+            seeds.append(far_key)
+
+        children = [_NDNode(node) for _ in seeds]
+        for key, item in points:
+            dists = [sum([(a - b) ** 2 for a, b in zip(key, s)]) for s in seeds]
+            child = children[dists.index(min(dists))]
+            child.points.append((key, item))
+            child.extend_bounds(key)
+
+        node.points = None
+        node.children = [child for child in children if len(child.points) > 0]
+
+class ParetoArchive():
+    def __init__(self, epsilon = 0, similar = eq):
+        """Hall of fame keeping non-dominated individuals.
+            It is compatible with deap.tools.ParetoFront
+            (the same individuals in the same order are kept if epsilon is 0),
+            but the individuals are stored as compact copies without routed graphs
+            and dominance queries are accelerated by ND-tree.
+
+            Option:
+                epsilon (float): if it is positive, the archive size is bounded with
+                                 epsilon-dominance. Each objective space is divided into
+                                 boxes whose size is about epsilon relative to the value,
+                                 and at most one individual is kept for each box.
+                similar (function): a function to check whether two individuals
+                                    are the same or not
+        """
+        self.__epsilon = epsilon
+        self.similar = similar
+        # fitnesses in ascending order
+        self.keys = []
+        # individuals in descending order of fitness
+        self.items = []
+        self.__index = NDTree()
+
+    def __box(self, ind):
+        """Returns a key of the individual for dominance check.
+        """
+        wvalues = ind.fitness.wvalues
+        if self.__epsilon <= 0:
+            return wvalues
+        # logarithmic grid applicable to both positive and negative values
+        unit = math.log1p(self.__epsilon)
+        return tuple([math.copysign(math.floor(math.log1p(abs(v)) / unit), v) for v in wvalues])
+
+    def update(self, population):
+        """Updates the archive with the population.
+
+            Args:
+                population (list): individuals to be archived
+
+            Returns: None
+        """
+        for ind in population:
+            key = self.__box(ind)
+            if not self.__index.findDominating(key) is None:
+                continue
+
+            same = self.__index.findEqual(key)
+            if self.__epsilon <= 0:
+                if any([hofer.fitness == ind.fitness and self.similar(ind, hofer) \
+                        for hofer in same]):
+                    continue
+            elif len(same) > 0:
+                # only one individual in a box
+                if not ind.fitness.dominates(same[0].fitness):
+                    continue
+                self.__remove(same[0])
+
+            for hofer in self.__index.findDominated(key):
+                self.__remove(hofer)
+            self.__insert(ind)
+
+    def __insert(self, ind):
+        item = ind.compactCopy()
+        i = bisect_right(self.keys, item.fitness)
+        self.items.insert(len(self) - i, item)
+        self.keys.insert(i, item.fitness)
+        self.__index.insert(self.__box(item), item)
+
+    def __remove(self, item):
+        index = next(i for i, hofer in enumerate(self.items) if hofer is item)
+        self.__index.remove(self.__box(item), item)
+        del self.keys[len(self) - (index + 1)]
+        del self.items[index]
+
+    def signature(self):
+        """Returns a signature of the archive.
+            The signature changes when the set of the fitnesses changes.
+        """
+        return (len(self), frozenset([key.values for key in self.keys]))
+
+    def __len__(self):
+        return len(self.items)
+
+    def __getitem__(self, i):
+        return self.items[i]
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __reversed__(self):
+        return reversed(self.items)
+
+    def __str__(self):
+        return str(self.items)
@@ -0,0 +1,223 @@
+#  This file is part of GenMap and released under the MIT License, see LICENSE.
+#  Author: Takuya Kojima
+
+from AStarRouter import AStarRouter, ALU_OUT_WEIGTH, PENALTY_CONST
+
+import networkx as nx
+import numpy as np
+
+# default number of negotiation iterations
+DEFAULT_ITERATIONS = 8
+# present congestion factor at the first iteration
+INIT_PRES_FAC = 0.5
+# multiplier of the present congestion factor for each iteration
+PRES_FAC_MULT = 2.0
+# increment of the history cost per overuse
+HIST_FAC = 1.0
+
+class PathFinderRouter(AStarRouter):
+    """Negotiated congestion router based on PathFinder
+        (L. McMurchie and C. Ebeling, "PathFinder: A Negotiation-Based
+        Performance-Driven Router for FPGAs", FPGA'95).
+
+        The routing among the computation nodes is iteratively ripped up and
+        rerouted with the present and history congestion costs of the routing
+        resources, so that a resource competed by some sources is given to
+        the one for which the resource is the most necessary.
+        The other routing stages (const, input, output) are the same as AStarRouter.
+    """
+
+    @staticmethod
+    def parse_options(options):
+        """Parses router options.
+
+            Available options:
+                iterations: the maximum number of negotiation iterations (positive integer)
+                fanout: fanout routing mode for the stages other than
+                        the computation routing (see AStarRouter)
+                the other options of AStarRouter are also available
+        """
+        options = dict(options)
+        iterations = DEFAULT_ITERATIONS
+        if "iterations" in options:
+            value = options.pop("iterations")
+            try:
+                iterations = int(value)
+            except ValueError:
+                raise ValueError("Invalid iterations for PathFinderRouter: " + value)
+            if iterations < 1:
+                raise ValueError("iterations for PathFinderRouter must be positive")
+        parsed = AStarRouter.parse_options(options)
+        parsed["iterations"] = iterations
+        return parsed
+
+    @staticmethod
+    def comp_routing(CGRA, comp_DFG, mapping, routed_graph, budget = None, **info):
+        state = AStarRouter.init_comp_routing(CGRA, mapping, routed_graph, **info)
+        compiled = state.compiled
+        indices = compiled.indices
+
+        # routing resources which can be used by only a source
+        #   SEs and ALUs for routing
+        mapped_alus = set(CGRA.getMappedALUs(mapping).values())
+        relay = np.array([CGRA.isSE(v) or \
+                            (CGRA.isALU(v) and not v in mapped_alus and \
+                             routed_graph.nodes[v]["routable"]) \
+                          for v in compiled.names], dtype = bool)
+        relay_edges = relay[indices]
+
+        # nets in the same order as AStarRouter
+        #   list of (src alu, dict of dst alu and operand, base weights)
+        out_deg = {v: comp_DFG.out_degree(v) for v in comp_DFG.nodes() if comp_DFG.out_degree(v) > 0 }
+        nets = []
+        for src_node, _ in sorted(out_deg.items(), key=lambda x: x[1]):
+            src_alu = CGRA.getNodeName("ALU", pos = mapping[src_node])
+            dest_alus = {CGRA.getNodeName("ALU", pos = mapping[dst_node]): \
+                            comp_DFG.edges[src_node, dst_node]["operand"] \
+                            for dst_node in \
+                            sorted(list(comp_DFG.successors(src_node)), \
+                                key=lambda x: (abs(mapping[x][0] - mapping[src_node][0]), \
+                                               abs(mapping[x][1] - mapping[src_node][1]))) }
+            # the source ALU output is available only for this net
+            base = state.weight.copy()
+            for suc_element in routed_graph.successors(src_alu):
+                if CGRA.isALU(suc_element) and \
+                        not routed_graph.nodes[suc_element]["routable"]:
+                    continue
+                e = (src_alu, suc_element)
+                if routed_graph.edges[e]["free"]:
+                    base[compiled.edge_ids[e]] = CGRA.getLinkWeight(e)
+            nets.append((src_alu, dest_alus, base))
+
+        # negotiation
+        #   occupancy: the number of nets using each relay node
+        #   hist: history cost of each relay node
+        occupancy = np.zeros(compiled.nodeCount(), dtype = np.int64)
+        hist = np.zeros(compiled.nodeCount(), dtype = np.float64)
+        pres_fac = INIT_PRES_FAC
+        # routing results for each net
+        #   list of (path, base cost) for each destination (None if failed)
+        results = [None] * len(nets)
+        # relay node ids used by each net
+        usages = [np.zeros(0, dtype = np.int64)] * len(nets)
+        reroute = list(range(len(nets)))
+
+        for _ in range(info.get("iterations", DEFAULT_ITERATIONS)):
+            for i in reroute:
+                src_alu, dest_alus, base = nets[i]
+                # rip up
+                occupancy[usages[i]] -= 1
+                # negotiated cost of entering each node
+                weight = np.where(relay_edges, \
+                                  (base + hist[indices]) * (1 + pres_fac * occupancy[indices]), \
+                                  base)
+                # paths exceeding this bound cannot satisfy the base cost limit
+                limit = (ALU_OUT_WEIGTH + hist.sum()) * (1 + pres_fac * occupancy.max())
+                results[i], usage = PathFinderRouter.__route_net(state, src_alu, dest_alus, \
+                                                                  base, relay, weight, limit)
+                usages[i] = np.array(sorted(usage), dtype = np.int64)
+                occupancy[usages[i]] += 1
+
+            overused = occupancy > 1
+            if not overused.any():
+                break
+            # reroute only the nets using the congested resources
+            reroute = [i for i in range(len(nets)) if overused[usages[i]].any()]
+            hist[overused] += HIST_FAC * (occupancy[overused] - 1)
+            pres_fac *= PRES_FAC_MULT
+
+        # reflect the results in the net order
+        # a resource still congested is given to the first net
+        route_cost = 0
+        owner = {}
+        for i, (src_alu, dest_alus, base) in enumerate(nets):
+            committed = set([src_alu])
+            paths = []
+            for (dst, operand), result in zip(dest_alus.items(), results[i]):
+                if result is None or \
+                        not PathFinderRouter.__available(CGRA, routed_graph, result[0], \
+                                                          i, owner, committed):
+                    route_cost += PENALTY_CONST
+                else:
+                    path, cost = result
+                    route_cost += cost
+                    paths.append((path, operand))
+                    for v in path[1:-1]:
+                        owner[v] = i
+                        committed.add(v)
+                if not budget is None and route_cost > budget:
+                    # the remaining edges are not routed
+                    PathFinderRouter.record_failure(routed_graph, "comp", src_alu, dst)
+                    return route_cost
+            AStarRouter.route_fixed_paths(CGRA, routed_graph, src_alu, paths, dest_alus)
+
+        return route_cost
+
+    @staticmethod
+    def __route_net(state, src, dsts, base, relay, weight, limit):
+        """Routes a single source to multiple destinations as a tree
+            with negotiated costs.
+
+            Args:
+                state (RoutingState): routing state of the routed graph
+                src (str): source node name
+                dsts (dict): destination node names and operands
+                base (numpy.ndarray): base edge weights for the source
+                relay (numpy.ndarray): flags of relay nodes
+                weight (numpy.ndarray): negotiated edge weights
+                limit (float): upper limit of the negotiated cost
+
+            Returns:
+                (list, set): (path, base cost) for each destination (None if failed),
+                             relay node ids used by the tree
+        """
+        compiled = state.compiled
+        ids = compiled.ids
+        edge_ids = compiled.edge_ids
+        tree = [src]
+        usage = set()
+        result = []
+        for dst in dsts.keys():
+            try:
+                path, _ = state.findPathFrom(tree, dst, limit, weight)
+            except nx.exception.NetworkXNoPath:
+                result.append(None)
+                continue
+            cost = sum([base[edge_ids[(path[j], path[j + 1])]] for j in range(len(path) - 1)])
+            if cost > ALU_OUT_WEIGTH:
+                result.append(None)
+                continue
+            result.append((path, cost.item()))
+            for v in path[1:-1]:
+                if relay[ids[v]]:
+                    tree.append(v)
+                    usage.add(ids[v])
+        return result, usage
+
+    @staticmethod
+    def __available(CGRA, routed_graph, path, net, owner, committed):
+        """Checks whether a path can be reflected on the routed graph.
+
+            Args:
+                CGRA (PEArrayModel): A model of the CGRA
+                routed_graph (networkx DiGraph): A graph where the paths are routed
+                path (list): the path
+                net (int): index of the net
+                owner (dict): net index for each already used relay node
+                committed (set): nodes of the routing tree of the net
+
+            Returns:
+                bool: True if available, otherwise False
+        """
+        if not path[0] in committed:
+            # the branch point has failed
+            return False
+        if routed_graph.nodes[path[-1]]["in_capacity"] <= 0:
+            return False
+        for j in range(len(path) - 1):
+            if not routed_graph.has_edge(path[j], path[j + 1]):
+                return False
+        for v in path[1:-1]:
+            if owner.get(v, net) != net:
+                return False
+        return True
@@ -1,7 +1,7 @@
 #  This file is part of GenMap and released under the MIT License, see LICENSE.
 #  Author: Takuya Kojima
 
-from EvalBase import EvalBase
+from EvalBase import EvalBase, COST_EXPENSIVE
 from DataPathAnalysis import DataPathAnalysis
 from SolverSetup import SolverSetup
 
@@ -176,9 +176,9 @@ class PowerEval(EvalBase):
         mapping = individual.mapping
         graph = individual.routed_graph
         op_attr = nx.get_node_attributes(app.getCompSubGraph(), "opcode")
-        opcodes = {CGRA.getNodeName("ALU", pos): op_attr[op_label] \
+        opcodes = {alu: op_attr[op_label] \
                      if op_label in op_attr.keys() else "CAT" \
-                         for op_label, pos in mapping.items()}
+                         for op_label, alu in CGRA.getMappedALUs(mapping).items()}
         # for routing ALU
         for alu, flag in nx.get_node_attributes(graph, "route").items():
             if flag:
@@ -231,12 +231,9 @@ class PowerEval(EvalBase):
 
             # make domain table
             #    key: node name, value: domain ID
-            domain_table = {}
-            for node in individual.routed_graph.nodes():
-                for domain in bb_domains.keys():
-                    if node in bb_domains[domain]["ALU"] or \
-                        node in bb_domains[domain]["SE"]:
-                        domain_table[node] = domkey2ID[domain]
+            domain_table = {node: domkey2ID[CGRA.getNodeBBdomain(node)] \
+                            for node in individual.routed_graph.nodes() \
+                            if not CGRA.getNodeBBdomain(node) is None}
 
             # get maximum latency
             max_lat = app.getClockPeriod(sim_params.getTimeUnit())
@@ -628,12 +625,9 @@ class PowerEval(EvalBase):
 
             # make domain table
             #    key: node name, value: domain name
-            domain_table = {}
-            for node in individual.routed_graph.nodes():
-                for domain in bb_domains.keys():
-                    if node in bb_domains[domain]["ALU"] or \
-                        node in bb_domains[domain]["SE"]:
-                        domain_table[node] = domain
+            domain_table = {node: CGRA.getNodeBBdomain(node) \
+                            for node in individual.routed_graph.nodes() \
+                            if not CGRA.getNodeBBdomain(node) is None}
 
             # get maximum latency
             max_lat = app.getClockPeriod(sim_params.getTimeUnit())
@@ -699,10 +693,9 @@ class PowerEval(EvalBase):
         opcodes = PowerEval.get_opcodes(CGRA, app, individual)
 
         if CGRA.getPregNumber() != 0:
-            stage_domains = CGRA.getStageDomains(individual.preg)
             nx.set_node_attributes(graph, -1, "stage")
             for v in graph.nodes():
-                graph.node[v]["stage"] = PowerEval.__getStageIndex(stage_domains, v)
+                graph.node[v]["stage"] = CGRA.getNodeStage(v, individual.preg)
         else:
             nx.set_node_attributes(graph, -1, "stage")
 
@@ -750,16 +743,6 @@ class PowerEval(EvalBase):
 
         return S_total * sim_params.switching_energy
 
-    @staticmethod
-    def __getStageIndex(stage_domains, node):
-        for stage in range(len(stage_domains)):
-            if node in stage_domains[stage]:
-                break
-        else:
-            stage = -1
-
-        return stage
-
 
     @staticmethod
     def isMinimize():
@@ -768,3 +751,22 @@ class PowerEval(EvalBase):
     @staticmethod
     def name():
         return "Power_Consumption"
+
+    @staticmethod
+    def costClass():
+        return COST_EXPENSIVE
+
+    @staticmethod
+    def dependencies(**info):
+        # map width is used for mapping duplication
+        if info.get("duplicate_enable") is True:
+            return ["MapWidthEval"]
+        return []
+
+    @staticmethod
+    def mayInvalidate():
+        return True
+
+    @staticmethod
+    def penaltyValue():
+        return PENALTY_COST
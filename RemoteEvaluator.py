@@ -0,0 +1,397 @@
+#  This file is part of GenMap and released under the MIT License, see LICENSE.
+#  Author: Takuya Kojima
+
+import socket
+import struct
+import pickle
+import threading
+import ipaddress
+import hashlib
+import hmac
+import sys
+import os
+from collections import deque
+
+# header of each message (length of the pickled payload)
+HEADER = struct.Struct("!Q")
+
+# maximum retry count of a task whose worker has died
+MAX_RETRY = 3
+
+# environment variable of the authentication key shared by a master and workers
+AUTHKEY_ENV = "GENMAP_AUTHKEY"
+# size of the challenge sent by a worker
+CHALLENGE_SIZE = 32
+# timeout of the authentication in seconds
+AUTH_TIMEOUT = 10
+
+class AuthenticationError(ConnectionError):
+    pass
+
+def parse_address(address):
+    """Parses a worker address.
+
+        Args:
+            address (str): "host:port" for TCP, otherwise a path of unix domain socket
+
+        Returns:
+            tuple: (socket family, address for the socket)
+    """
+    host, sep, port = address.rpartition(":")
+    if sep != "" and port.isdigit():
+        return socket.AF_INET, (host if host != "" else "localhost", int(port))
+    else:
+        return socket.AF_UNIX, address
+
+def get_authkey():
+    """Returns the authentication key specified by the environment variable.
+
+        Returns:
+            bytes: the key (None if not specified)
+    """
+    key = os.environ.get(AUTHKEY_ENV, "")
+    return key.encode() if key != "" else None
+
+def is_loopback(address):
+    """Checks whether a TCP address is reachable only from the local host.
+
+        Args:
+            address (tuple): (host, port)
+
+        Returns:
+            bool: True if all the resolved addresses are loopback
+    """
+    try:
+        infos = socket.getaddrinfo(address[0], address[1], type=socket.SOCK_STREAM)
+    except OSError:
+        return False
+    return len(infos) > 0 and \
+        all([ipaddress.ip_address(info[4][0].split("%")[0]).is_loopback for info in infos])
+
+def deliver_challenge(sock, authkey):
+    """Authenticates a peer with HMAC of a random challenge (worker side).
+        Nothing sent by the peer is unpickled before the authentication.
+
+        Args:
+            sock (socket.socket): connected socket
+            authkey (bytes): authentication key (None if not used)
+
+        Raise:
+            AuthenticationError: if the peer does not have the same key
+    """
+    # an empty challenge means that no key is required
+    nonce = os.urandom(CHALLENGE_SIZE) if not authkey is None else b""
+    _send_bytes(sock, nonce)
+    if authkey is None:
+        return
+    digest = _recv_bytes(sock, hashlib.sha256().digest_size)
+    if not hmac.compare_digest(digest, hmac.new(authkey, nonce, "sha256").digest()):
+        _send_bytes(sock, b"NG")
+        raise AuthenticationError("authentication key mismatch")
+    _send_bytes(sock, b"OK")
+
+def answer_challenge(sock, authkey):
+    """Answers the challenge sent by deliver_challenge (master side).
+
+        Args:
+            sock (socket.socket): connected socket
+            authkey (bytes): authentication key (None if not used)
+
+        Raise:
+            AuthenticationError: if the keys are not consistent with the peer
+    """
+    nonce = _recv_bytes(sock, CHALLENGE_SIZE)
+    if len(nonce) == 0:
+        if not authkey is None:
+            raise AuthenticationError("the worker does not use the authentication key")
+        return
+    if authkey is None:
+        raise AuthenticationError("the worker requires the authentication key " + \
+                                  "(set {0})".format(AUTHKEY_ENV))
+    _send_bytes(sock, hmac.new(authkey, nonce, "sha256").digest())
+    if _recv_bytes(sock, 2) != b"OK":
+        raise AuthenticationError("authentication key mismatch")
+
+def _send_bytes(sock, data):
+    sock.sendall(HEADER.pack(len(data)) + data)
+
+def _recv_bytes(sock, max_size):
+    size, = HEADER.unpack(_recv_exact(sock, HEADER.size))
+    if size > max_size:
+        raise AuthenticationError("unexpected message")
+    return _recv_exact(sock, size)
+
+def send_message(sock, obj):
+    """Sends a python object with length prefix.
+
+        Args:
+            sock (socket.socket): connected socket
+            obj (object): picklable object
+    """
+    payload = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    sock.sendall(HEADER.pack(len(payload)) + payload)
+
+def _recv_exact(sock, size):
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(min(size - len(buf), 1 << 20))
+        if len(chunk) == 0:
+            raise EOFError("connection closed")
+        buf += chunk
+    return bytes(buf)
+
+def recv_message(sock):
+    """Receives a python object sent by send_message.
+
+        Args:
+            sock (socket.socket): connected socket
+
+        Returns:
+            object: received object
+
+        Raise:
+            EOFError: if the connection is closed
+    """
+    size, = HEADER.unpack(_recv_exact(sock, HEADER.size))
+    return pickle.loads(_recv_exact(sock, size))
+
+class RemoteEvaluator():
+    def __init__(self, addresses, initializer = None, initargs = (), authkey = None):
+        """Constructor of the RemoteEvaluator class.
+            It has the same interface as multiprocessing.Pool used in NSGA2
+            but tasks are evaluated by worker daemons (EvalWorker.py).
+
+            Args:
+                addresses (list of str): addresses of the workers
+                Optional:
+                    initializer (function): a function called by each worker process
+                                            at the beginning
+                    initargs (tuple): arguments for the initializer
+                    authkey (bytes): authentication key for the workers
+                                     If it is None, the key is taken from
+                                     the environment variable GENMAP_AUTHKEY.
+
+            Raise:
+                ConnectionError: if it fails to connect a worker
+                                 or no worker is specified
+        """
+        if authkey is None:
+            authkey = get_authkey()
+        self.__lock = threading.Lock()
+        # tasks waiting for a worker
+        self.__pending = deque()
+        # task information
+        #   key: task id
+        #   value: list of [func, args, callback, error_callback, retry count]
+        self.__tasks = {}
+        # connected workers
+        #   key: socket
+        #   value: dict of address, capacity and running tasks
+        self.__workers = {}
+        self.__receivers = []
+        self.__next_id = 0
+        self.__closed = False
+
+        for address in addresses:
+            family, addr = parse_address(address)
+            try:
+                sock = socket.socket(family, socket.SOCK_STREAM)
+                sock.connect(addr)
+                if family == socket.AF_INET:
+                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+                    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                sock.settimeout(AUTH_TIMEOUT)
+                answer_challenge(sock, authkey)
+                sock.settimeout(None)
+                # the evaluation context is sent only once for each worker
+                send_message(sock, ("init", initializer, initargs))
+                _, capacity = recv_message(sock)
+            except (OSError, EOFError) as e:
+                sock.close()
+                self.close()
+                raise ConnectionError("Fail to connect evaluation worker {0}: {1}".format(address, e))
+            self.__workers[sock] = {"address": address, "capacity": capacity, "running": set()}
+
+        if len(self.__workers) == 0:
+            raise ConnectionError("no evaluation worker specified")
+
+        for sock in self.__workers.keys():
+            receiver = threading.Thread(target=self.__receive, args=(sock, ), daemon=True)
+            receiver.start()
+            self.__receivers.append(receiver)
+
+    def capacity(self):
+        """Returns the number of tasks evaluated concurrently.
+        """
+        with self.__lock:
+            return sum([worker["capacity"] for worker in self.__workers.values()])
+
+    def apply_async(self, func, args = (), callback = None, error_callback = None):
+        """Evaluates a task asynchronously.
+
+            Args:
+                func (function): a function to be called in a worker
+                                 It must be picklable, i.e., defined at module level.
+                Optional:
+                    args (tuple): arguments for the function
+                    callback (function): called with the result
+                    error_callback (function): called with an exception raised
+                                               in the worker or with ConnectionError
+                                               when the task cannot be evaluated
+
+            Returns: None
+        """
+        with self.__lock:
+            task = [func, args, callback, error_callback, 0]
+            if len(self.__workers) == 0:
+                # all the workers have been lost
+                failed = [(task, ConnectionError("no evaluation worker available"))]
+            else:
+                task_id = self.__next_id
+                self.__next_id += 1
+                self.__tasks[task_id] = task
+                self.__pending.append(task_id)
+                failed = self.__dispatch()
+        self.__notify(failed)
+
+    def map(self, func, iterable, chunksize = None):
+        """Evaluates tasks and waits for all the results.
+
+            Args:
+                func (function): a function to be called in workers
+                iterable (iterable): an argument for each task
+                Optional:
+                    chunksize (int): only for compatibility with multiprocessing.Pool
+                                     Tasks are sent one by one to balance loads.
+
+            Returns:
+                list: results in the order of the arguments
+        """
+        args_list = list(iterable)
+        results = [None] * len(args_list)
+        errors = []
+        done = threading.Semaphore(0)
+
+        for i, args in enumerate(args_list):
+            def callback(value, i = i):
+                results[i] = value
+                done.release()
+            def error_callback(e):
+                errors.append(e)
+                done.release()
+            self.apply_async(func, (args, ), callback, error_callback)
+
+        for _ in range(len(args_list)):
+            done.acquire()
+        if len(errors) > 0:
+            raise errors[0]
+        return results
+
+    def close(self):
+        """Disconnects all the workers.
+        """
+        with self.__lock:
+            self.__closed = True
+            socks = list(self.__workers.keys())
+        for sock in socks:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def join(self):
+        """Waits for the receiver threads to finish.
+            It must be called after close.
+        """
+        for receiver in self.__receivers:
+            receiver.join()
+
+    def __dispatch(self):
+        """Sends pending tasks to workers having free slots.
+            It must be called with the lock acquired.
+
+            Returns:
+                list: failed tasks to be notified
+        """
+        failed = []
+        dead = []
+        for sock, worker in self.__workers.items():
+            while len(worker["running"]) < worker["capacity"] and len(self.__pending) > 0:
+                task_id = self.__pending.popleft()
+                func, args = self.__tasks[task_id][0:2]
+                try:
+                    send_message(sock, ("eval", task_id, func, args))
+                except OSError:
+                    self.__pending.appendleft(task_id)
+                    dead.append(sock)
+                    break
+                worker["running"].add(task_id)
+        for sock in dead:
+            failed += self.__lost(sock)
+        if len(dead) > 0 and len(self.__workers) > 0:
+            failed += self.__dispatch()
+        return failed
+
+    def __lost(self, sock):
+        """Removes a dead worker and requeues its running tasks.
+            It must be called with the lock acquired.
+
+            Returns:
+                list: failed tasks to be notified
+        """
+        worker = self.__workers.pop(sock, None)
+        if worker is None:
+            return []
+        sock.close()
+        if not self.__closed:
+            print("Warning: lost evaluation worker {0}".format(worker["address"]), \
+                  file=sys.stderr)
+
+        failed = []
+        for task_id in worker["running"]:
+            self.__tasks[task_id][4] += 1
+            if self.__tasks[task_id][4] > MAX_RETRY:
+                failed.append((task_id, "retry count exceeded"))
+            else:
+                self.__pending.appendleft(task_id)
+
+        if len(self.__workers) == 0:
+            failed += [(task_id, "no evaluation worker available") for task_id in self.__pending]
+            self.__pending.clear()
+
+        return [(self.__tasks.pop(task_id), ConnectionError(msg)) for task_id, msg in failed]
+
+    @staticmethod
+    def __notify(failed):
+        for task, e in failed:
+            if not task[3] is None:
+                task[3](e)
+
+    def __receive(self, sock):
+        """Receives results from a worker (run in a thread).
+        """
+        while True:
+            try:
+                task_id, success, value = recv_message(sock)
+            except (OSError, EOFError, pickle.UnpicklingError):
+                with self.__lock:
+                    failed = self.__lost(sock)
+                    if len(self.__workers) > 0:
+                        failed += self.__dispatch()
+                self.__notify(failed)
+                return
+
+            with self.__lock:
+                if not sock in self.__workers:
+                    # the task has been already requeued
+                    return
+                self.__workers[sock]["running"].discard(task_id)
+                task = self.__tasks.pop(task_id)
+                failed = self.__dispatch()
+            self.__notify(failed)
+
+            if success:
+                if not task[2] is None:
+                    task[2](value)
+            elif not task[3] is None:
+                task[3](value)
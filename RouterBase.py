@@ -4,7 +4,79 @@
 from abc import ABCMeta, abstractmethod
 import networkx as nx
 
+# graph attribute to keep the failure which makes the routing cost exceed the budget
+FAILURE_KEY = "routing_failure"
+
 class RouterBase(metaclass=ABCMeta):
+    @staticmethod
+    def parse_options(options):
+        """Parses router options.
+            The options are given as attributes of Router element
+            in the optimization setting and the parsed options are passed
+            to the routing methods as keyword arguments.
+            Please override this method if the router has some options.
+
+            Args:
+                options (dict): router options
+                    keys (str): option names
+                    values (str): option values
+
+            Returns:
+                dict: parsed options
+
+            Raise:
+                ValueError: if there is an invalid option
+        """
+        if len(options) > 0:
+            raise ValueError("Unknown router options: " + ", ".join(options.keys()))
+        return {}
+
+    @staticmethod
+    def get_routing_stats(routed_graph):
+        """Returns statistics of the routing for performance monitoring.
+            They are summed up for each generation and shown in the log.
+            Please override this method if the router has some statistics.
+
+            Args:
+                routed_graph (networkx DiGraph): PE array graph
+                                                 where the routing has been done
+
+            Returns:
+                dict: statistics
+                    keys (str): names of the statistics
+                    values (int): counts
+                    For a pair of "<name>_hit" and "<name>_miss",
+                    the hit rate is also shown.
+        """
+        return {}
+
+    @staticmethod
+    def record_failure(routed_graph, stage, src, dst):
+        """Records a routing failure which makes the routing cost exceed the budget.
+
+            Args:
+                routed_graph (networkx DiGraph): PE array graph
+                stage (str): routing stage ("comp", "const", "input", "output" or "inout")
+                src (str): source node name of the failed net (None if unknown)
+                dst (str): destination node name of the failed net (None if unknown)
+
+            Returns: None
+        """
+        routed_graph.graph[FAILURE_KEY] = (stage, src, dst)
+
+    @staticmethod
+    def get_routing_failure(routed_graph):
+        """Returns the recorded routing failure.
+
+            Args:
+                routed_graph (networkx DiGraph): PE array graph
+
+            Returns:
+                tuple: (stage, source node name, destination node name)
+                       None if no failure is recorded
+        """
+        return routed_graph.graph.get(FAILURE_KEY)
+
     @staticmethod
     @abstractmethod
     def set_default_weights(CGRA):
@@ -20,7 +92,7 @@ class RouterBase(metaclass=ABCMeta):
 
     @staticmethod
     @abstractmethod
-    def comp_routing(CGRA, comp_DFG, mapping, routed_graph, **info):
+    def comp_routing(CGRA, comp_DFG, mapping, routed_graph, budget = None, **info):
         """Routes a computation DFG on the PE array.
 
             Args:
@@ -30,6 +102,16 @@ class RouterBase(metaclass=ABCMeta):
                     keys (str): operation label of DFG
                     values (tuple): PE coordinates
                 routed_graph (networkx DiGraph): PE array graph
+                Optional:
+                    budget (int or float): routing cost budget
+                        If the cost exceeds it, the routing can be stopped
+                        without routing the remaining edges, and the failure
+                        is recorded by record_failure. Then, the returned cost
+                        only has to exceed the budget.
+                    inherited_routes (dict): routes inherited from the parents
+                        keys (tuple): source and destination ALU names
+                        values (list): node names of the path
+                        They can be reused if they are still available in this mapping.
 
             Returns:
                 int: routing cost
@@ -44,7 +126,7 @@ class RouterBase(metaclass=ABCMeta):
 
     @staticmethod
     @abstractmethod
-    def const_routing(CGRA, const_DFG, mapping, routed_graph, **info):
+    def const_routing(CGRA, const_DFG, mapping, routed_graph, budget = None, **info):
         """Routes a computation DFG on the PE array.
 
             Args:
@@ -54,6 +136,12 @@ class RouterBase(metaclass=ABCMeta):
                     keys (str): operation label of DFG
                     values (tuple): PE coordinates
                 routed_graph (networkx DiGraph): PE array graph
+                Optional:
+                    budget (int or float): routing cost budget
+                        If the cost exceeds it, the routing can be stopped
+                        without routing the remaining edges, and the failure
+                        is recorded by record_failure. Then, the returned cost
+                        only has to exceed the budget.
 
             Returns:
                 int: routing cost
@@ -70,7 +158,7 @@ class RouterBase(metaclass=ABCMeta):
 
     @staticmethod
     @abstractmethod
-    def input_routing(CGRA, in_DFG, mapping, routed_graph, **info):
+    def input_routing(CGRA, in_DFG, mapping, routed_graph, budget = None, **info):
         """Routes a computation DFG on the PE array.
 
             Args:
@@ -80,6 +168,12 @@ class RouterBase(metaclass=ABCMeta):
                     keys (str): operation label of DFG
                     values (tuple): PE coordinates
                 routed_graph (networkx DiGraph): PE array graph
+                Optional:
+                    budget (int or float): routing cost budget
+                        If the cost exceeds it, the routing can be stopped
+                        without routing the remaining edges, and the failure
+                        is recorded by record_failure. Then, the returned cost
+                        only has to exceed the budget.
 
             Returns:
                 int: routing cost
@@ -95,7 +189,7 @@ class RouterBase(metaclass=ABCMeta):
 
     @staticmethod
     @abstractmethod
-    def output_routing(CGRA, out_DFG, mapping, routed_graph, **info):
+    def output_routing(CGRA, out_DFG, mapping, routed_graph, preg_conf = None, budget = None, **info):
         """Routes a computation DFG on the PE array.
 
             Args:
@@ -109,6 +203,7 @@ class RouterBase(metaclass=ABCMeta):
                     preg_conf: Pipeline configuration if the PE Array is pipelined.
                                If it is not None, pipeline latency is adjusted
                                by extending output data path.
+                    budget (int or float): routing cost budget (see comp_routing)
 
             Returns:
                 int: routing cost
@@ -122,7 +217,7 @@ class RouterBase(metaclass=ABCMeta):
 
     @staticmethod
     @abstractmethod
-    def inout_routing(CGRA, in_DFG, out_DFG, mapping, routed_graph, **info):
+    def inout_routing(CGRA, in_DFG, out_DFG, mapping, routed_graph, budget = None, **info):
         """Routes a computation DFG on the PE array.
 
             Args:
@@ -133,6 +228,12 @@ class RouterBase(metaclass=ABCMeta):
                     keys (str): node names of DFG
                     values (tuple): PE coordinates
                 routed_graph (networkx DiGraph): PE array graph
+                Optional:
+                    budget (int or float): routing cost budget
+                        If the cost exceeds it, the routing can be stopped
+                        without routing the remaining edges, and the failure
+                        is recorded by record_failure. Then, the returned cost
+                        only has to exceed the budget.
 
             Returns:
                 int: routing cost
@@ -1,7 +1,7 @@
 #  This file is part of GenMap and released under the MIT License, see LICENSE.
 #  Author: Takuya Kojima
 
-from EvalBase import EvalBase
+from EvalBase import EvalBase, COST_MODERATE
 from DataPathAnalysis import DataPathAnalysis
 import networkx as nx
 
@@ -45,9 +45,9 @@ class TimeSlackEval(EvalBase):
         # key:      node name of ALU
         # value:    list of delay value for each body bias voltage
         op_attr = nx.get_node_attributes(app.getCompSubGraph(), "opcode")
-        delay_table = {CGRA.getNodeName("ALU", pos): \
+        delay_table = {alu: \
                         sim_params.delay_info[op_attr[op_label] if op_label in op_attr.keys() else "CAT" ] \
-                            for op_label, pos in individual.mapping.items()}
+                            for op_label, alu in CGRA.getMappedALUs(individual.mapping).items()}
 
         delay_table.update({v: sim_params.delay_info["SE"]\
                             for v in individual.routed_graph.nodes() if CGRA.isSE(v)})
@@ -65,17 +65,8 @@ class TimeSlackEval(EvalBase):
                 # find fastest body bias voltage
                 fastest_bb = sorted(sim_params.delay_info["SE"])[-1]
                 body_bias = {domain_name: fastest_bb for domain_name in domains.keys()}
-            domain_table = {}
-            for v in individual.routed_graph.nodes():
-                for domain_name, resources in domains.items():
-                    if CGRA.isALU(v):
-                        if v in resources["ALU"]:
-                            domain_table[v] = domain_name
-                            break
-                    elif CGRA.isSE(v):
-                        if v in resources["SE"]:
-                            domain_table[v] = domain_name
-                            break
+            domain_table = {v: CGRA.getNodeBBdomain(v) for v in individual.routed_graph.nodes() \
+                            if not CGRA.getNodeBBdomain(v) is None}
 
         for dp in DataPathAnalysis.get_data_path(CGRA, individual):
             if not body_bias is None:
@@ -100,3 +91,16 @@ class TimeSlackEval(EvalBase):
     @staticmethod
     def name():
         return "Time_Slack"
+
+    @staticmethod
+    def costClass():
+        return COST_MODERATE
+
+    @staticmethod
+    def optionalDependencies(**info):
+        # body bias voltage optimized by PowerEval is used if available
+        return ["PowerEval"]
+
+    @staticmethod
+    def mayInvalidate():
+        return True
@@ -1,7 +1,7 @@
 #  This file is part of GenMap and released under the MIT License, see LICENSE.
 #  Author: Takuya Kojima
 
-from EvalBase import EvalBase
+from EvalBase import EvalBase, COST_CHEAP
 
 class WireLengthEval(EvalBase):
     def __init__(self):
@@ -17,4 +17,8 @@ class WireLengthEval(EvalBase):
 
     @staticmethod
     def name():
-        return "Wire_Length"
\ No newline at end of file
+        return "Wire_Length"
+
+    @staticmethod
+    def costClass():
+        return COST_CHEAP
@@ -112,22 +112,14 @@ class MyShell(Cmd):
             return
         else:
             if os.access(args[0], os.R_OK):
-                # parse XML file
+                # parse XML file and make model instance
                 try:
-                    tree_arch = ET.ElementTree(file=args[0])
+                    self.__target_arch = PEArrayModel.load(args[0])
                 except ET.ParseError as e:
                     print("Parse Error ({0})".format(args[0]), e.args, file=sys.stderr)
                     return
-                if tree_arch.getroot().tag == "PEArray":
-                    # make model instance
-                    try:
-                        self.__target_arch = PEArrayModel(tree_arch.getroot())
-                    except (ValueError, PEArrayModel.InvalidConfigError) as e:
-                        print("Invalid definition", e.args)
-                        return
-                else:
-                    print("Parse Error ({0})".format(args[0]), \
-                            "\nRoot tag name must be \"PEArray\"", file=sys.stderr)
+                except (ValueError, PEArrayModel.InvalidConfigError) as e:
+                    print("Invalid definition", e.args)
                     return
             else:
                 print("No such file: " + args[0], file=sys.stderr)